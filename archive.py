@@ -0,0 +1,171 @@
+"""
+Download Archive
+Persistent record (SQLite, WAL mode) of what has already been downloaded into
+a directory, keyed by extractor:video-id for streaming media and by canonical
+URL (plus ETag) for direct files. Checked before extraction or network I/O.
+An entry whose recorded file has been deleted no longer counts and is dropped.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+
+from metadata_cache import canonical_url, info_key
+
+
+ARCHIVE_FILENAME = ".smile_archive.sqlite3"  # Lives next to manifest.jsonl
+ANY_VARIANT = "*"  # Imported entries match every format/quality variant
+QUERY_BATCH = 500  # Keys per IN (...) query, under SQLite's parameter limit
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archive (
+    key TEXT NOT NULL,
+    variant TEXT NOT NULL DEFAULT '',
+    etag TEXT,
+    path TEXT,
+    added REAL,
+    PRIMARY KEY (key, variant)
+) WITHOUT ROWID
+"""
+
+
+def direct_key(url: str) -> str:
+    return f"url:{canonical_url(url)}"
+
+
+def streaming_keys(url: str) -> list:
+    """extractor:id keys derivable from a URL without extracting it (may be empty)."""
+    key = canonical_url(url)
+    if key.startswith("youtube:"):
+        return [key]
+    try:
+        from yt_dlp.extractor import gen_extractor_classes
+        for ie in gen_extractor_classes():
+            if ie.ie_key() != "Generic" and ie.suitable(url):
+                temp_id = ie.get_temp_id(url)
+                return [f"{ie.ie_key().lower()}:{temp_id}"] if temp_id else []
+    except Exception:
+        pass
+    return []
+
+
+class DownloadArchive:
+    """Set of (key, variant) pairs in an SQLite file; variant is e.g. the media format."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def lookup(self, key: str, variant: str = ""):
+        """(etag, path) of the entry for key, or None; an entry whose file is gone is removed."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT variant, etag, path FROM archive WHERE key = ? AND variant IN (?, ?)",
+                (key, variant, ANY_VARIANT)).fetchall()
+            for row_variant, etag, path in rows:
+                if not path or os.path.exists(path):
+                    return etag, path
+                self._conn.execute("DELETE FROM archive WHERE key = ? AND variant = ?", (key, row_variant))
+        return None
+
+    def contains(self, key: str, variant: str = "") -> bool:
+        return self.lookup(key, variant) is not None
+
+    def contains_any(self, keys, variant: str = "") -> bool:
+        return any(self.contains(key, variant) for key in keys)
+
+    def present(self, keys, variant: str = "") -> set:
+        """The subset of keys already archived, in batched queries (for large lists)."""
+        keys = list(dict.fromkeys(keys))
+        found = set()
+        with self._lock:
+            for i in range(0, len(keys), QUERY_BATCH):
+                batch = keys[i:i + QUERY_BATCH]
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, path FROM archive WHERE variant IN (?, ?) AND key IN ({marks})",
+                    (variant, ANY_VARIANT, *batch))
+                found.update(key for key, path in rows if not path or os.path.exists(path))
+        return found
+
+    def add(self, key: str, variant: str = "", path: str = None, etag: str = None):
+        if not key:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO archive (key, variant, etag, path, added) VALUES (?, ?, ?, ?, ?)",
+                (key, variant, etag, path, time.time()))
+
+    def add_info(self, info: dict, variant: str = "", path: str = None):
+        """Archive an extracted item under its extractor:id key."""
+        self.add(info_key(info), variant, path)
+
+    def remove(self, key: str, variant: str = None):
+        with self._lock:
+            if variant is None:
+                self._conn.execute("DELETE FROM archive WHERE key = ?", (key,))
+            else:
+                self._conn.execute("DELETE FROM archive WHERE key = ? AND variant = ?", (key, variant))
+
+    def import_lines(self, lines, variant: str = ANY_VARIANT) -> int:
+        """Bulk-add yt-dlp style "extractor id" lines (also "url <address>"); returns rows added."""
+        now = time.time()
+        rows = []
+        for line in lines:
+            prefix, _, rest = line.strip().partition(" ")
+            if prefix and rest:
+                rows.append((f"{prefix.lower()}:{rest.strip()}", variant, now))
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO archive (key, variant, added) VALUES (?, ?, ?)", rows)
+            self._conn.execute("COMMIT")
+            return self._conn.total_changes - before
+
+    def import_file(self, path: str, variant: str = ANY_VARIANT) -> int:
+        with open(path, "r", encoding="utf-8") as f:
+            return self.import_lines(f, variant)
+
+    def export_lines(self):
+        """Yield one "extractor id" line per archived key (yt-dlp --download-archive format)."""
+        with self._lock:
+            keys = [row[0] for row in self._conn.execute("SELECT DISTINCT key FROM archive ORDER BY key")]
+        for key in keys:
+            prefix, _, rest = key.partition(":")
+            yield f"{prefix} {rest}\n"
+
+    def export_file(self, path: str) -> int:
+        count = 0
+        with open(path, "w", encoding="utf-8") as f:
+            for line in self.export_lines():
+                f.write(line)
+                count += 1
+        return count
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM archive").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def get_archive(download_path: str) -> DownloadArchive:
+    """Get or open the archive of download_path."""
+    path = os.path.join(os.path.abspath(download_path), ARCHIVE_FILENAME)
+    with _archives_lock:
+        if path not in _archives:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _archives[path] = DownloadArchive(path)
+        return _archives[path]
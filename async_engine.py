@@ -0,0 +1,281 @@
+"""
+Asyncio Download Backend
+Runs many hundreds of direct transfers on one event loop with non-blocking HTTP
+(aiohttp) and file writes on a small executor. Exposes the same
+download(url, path, quality, format, hook) contract as engine.download.
+"""
+
+import os
+import time
+import atexit
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from engine import (
+    CHECKSUM_ALGORITHMS, WRITE_MANIFEST, DownloadCancelled, PartFile, ProgressTracker, claim_output,
+    download_streaming, filename_for, open_archive, part_path_for, release_output, STREAMING_OPTIONS,
+)
+from archive import direct_key
+from bandwidth import get_governor
+from content_store import ContentStore, get_content_store
+from hashing import FAST_HASH, OrderedHasher
+from integrity import IntegrityError, record, verify
+from metrics import get_metrics
+from router import DIRECT, STREAMING, get_router
+from tasks import TaskEvent
+from transport import USER_AGENT
+
+try:
+    import aiohttp
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+
+MAX_CONNECTIONS = 256  # Open sockets across all hosts
+MAX_CONNECTIONS_PER_HOST = 32  # Open sockets per host
+WRITE_WORKERS = 4  # Threads doing file writes and progress callbacks
+READ_SIZE = 262144  # 256KB reads; small objects finish in one or two
+SOCKET_TIMEOUT = 30
+CANCEL_POLL = 0.1  # Seconds between checks of events that are not TaskEvents (they cannot wake the loop)
+
+
+class AsyncDirectEngine:
+    """Event loop on a background thread that owns one aiohttp session."""
+
+    def __init__(self, max_connections: int = MAX_CONNECTIONS,
+                 max_per_host: int = MAX_CONNECTIONS_PER_HOST, write_workers: int = WRITE_WORKERS):
+        if not HAS_AIOHTTP:
+            raise RuntimeError("The asyncio backend requires the aiohttp package")
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=write_workers, thread_name_prefix="async-io")
+        self._session = None
+        self._thread = threading.Thread(target=self.loop.run_forever, name="async-engine", daemon=True)
+        self._thread.start()
+
+    async def _get_session(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.max_per_host)
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=SOCKET_TIMEOUT, sock_read=SOCKET_TIMEOUT)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                                  headers={"User-Agent": USER_AGENT})
+        return self._session
+
+    async def _etag(self, url: str):
+        """The URL's current ETag from a HEAD request, or None."""
+        session = await self._get_session()
+        try:
+            async with session.head(url, allow_redirects=True) as response:
+                return response.headers.get("etag") if response.status < 400 else None
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None
+
+    async def _fetch(self, url: str, part_path: str, algorithms: tuple, progress_hook=None,
+                     cancel_event: threading.Event = None, pause_event: threading.Event = None,
+                     task_key=None) -> tuple:
+        """Stream url into part_path; return (digests, response headers).
+
+        While `pause_event` is set the transfer waits on the loop, never on an executor thread.
+        TaskEvents wake it on every pause, resume or cancel; other events are polled.
+        """
+        loop = asyncio.get_running_loop()
+        governor = get_governor()
+        host = urlparse(url).hostname
+        changed = asyncio.Event()  # Set by every transition of a watched TaskEvent
+        events = [e for e in (pause_event, cancel_event) if e is not None]
+        watched = [e for e in events if isinstance(e, TaskEvent)]
+        poll = None if len(watched) == len(events) else CANCEL_POLL
+        for event in watched:
+            event.watch(loop, changed)
+        try:
+            session = await self._get_session()
+            requested = time.monotonic()
+            async with session.get(url) as response:
+                response.raise_for_status()
+                get_metrics().ttfb.observe(time.monotonic() - requested)
+                total_size = response.content_length or 0
+                hasher = OrderedHasher(part_path, algorithms)
+                tracker = ProgressTracker(url, total_size, progress_hook, throttled=False, cancel_event=cancel_event,
+                                          task_key=task_key)
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+                part = await loop.run_in_executor(self.executor, PartFile, part_path, 0, hasher)
+                try:
+                    pos = 0
+                    async for chunk in response.content.iter_chunked(READ_SIZE):
+                        while pause_event is not None and pause_event.is_set() and not tracker.cancelled:
+                            await _changed(changed, poll)
+                        if tracker.cancelled:
+                            raise DownloadCancelled()
+                        await loop.run_in_executor(self.executor, _write_chunk, part, pos, chunk, tracker)
+                        pos += len(chunk)
+                        wait = governor.reserve(len(chunk), host, tracker.task_key)
+                        if wait > 0:
+                            deadline = loop.time() + wait
+                            while not tracker.cancelled and loop.time() < deadline:
+                                timeout = deadline - loop.time()
+                                await _changed(changed, timeout if poll is None else min(timeout, poll))
+                finally:
+                    await loop.run_in_executor(self.executor, part.close)
+                digests = await loop.run_in_executor(self.executor, hasher.hexdigests)
+                return digests, response.headers
+        finally:
+            for event in watched:
+                event.unwatch(loop, changed)
+
+    async def download_direct(self, url: str, download_path: str, progress_hook=None, rate_limit: float = 0,
+                              dedupe: bool = False, sha256: str = None, fast_hash: bool = False,
+                              cancel_event: threading.Event = None, pause_event: threading.Event = None,
+                              task_key=None, **_unused) -> bool:
+        """Coroutine counterpart of engine.download_direct (single stream, no range resume)."""
+        loop = asyncio.get_running_loop()
+        sha256 = sha256.strip().lower() if sha256 else None
+        algorithms = CHECKSUM_ALGORITHMS + ((FAST_HASH,) if fast_hash else ())
+        started = time.time()
+        filepath = None
+        try:
+            archive = open_archive(download_path)
+            archived = await loop.run_in_executor(self.executor, archive.lookup, direct_key(url)) if archive else None
+            if archived is not None and (archived[0] is None or archived[0] == await self._etag(url)):
+                if progress_hook:
+                    await loop.run_in_executor(self.executor, progress_hook, {"status": "finished", "archived": True})
+                return True
+
+            filepath = claim_output(os.path.join(download_path, filename_for(url)))
+            part_path = part_path_for(filepath, task_key)
+            store = get_content_store(download_path) if dedupe else None
+            headers = {}
+
+            if store and store.has(sha256):
+                await loop.run_in_executor(self.executor, store.materialize, sha256, filepath)
+                digests = {"sha256": sha256}
+            else:
+                with get_governor().task_scope(url if task_key is None else task_key, rate_limit):
+                    digests, headers = await self._fetch(url, part_path, algorithms, progress_hook, cancel_event,
+                                                         pause_event, task_key)
+                try:
+                    verify(digests, sha256, part_path)
+                except IntegrityError:
+                    os.remove(part_path)
+                    raise
+                if store:
+                    keys = ContentStore.remote_keys(url, headers.get("etag"), headers.get("last-modified"),
+                                                    os.path.getsize(part_path))
+                    await loop.run_in_executor(self.executor, _ingest, store, part_path, filepath, keys,
+                                               digests["sha256"])
+                else:
+                    os.replace(part_path, filepath)
+
+            if WRITE_MANIFEST:
+                await loop.run_in_executor(self.executor, record, download_path, url, filepath, digests, started)
+            if archive:
+                await loop.run_in_executor(self.executor, lambda: archive.add(
+                    direct_key(url), path=filepath, etag=headers.get("etag")))
+            if progress_hook:
+                await loop.run_in_executor(self.executor, progress_hook, {"status": "finished"})
+            return True
+        except DownloadCancelled:
+            raise
+        except Exception as e:
+            if progress_hook:
+                error = {"status": "error", "error": str(e), "exception": e}
+                await loop.run_in_executor(self.executor, progress_hook, error)
+            return False
+        finally:
+            if filepath is not None:
+                release_output(filepath)
+
+    def submit(self, url: str, download_path: str, progress_hook=None, **options):
+        """Schedule a direct download on the loop and return a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(
+            self.download_direct(url, download_path, progress_hook, **options), self.loop)
+
+    def close(self):
+        """Close the HTTP session, stop the loop and the write executor."""
+        async def _shutdown():
+            if self._session is not None:
+                await self._session.close()
+
+        if self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(_shutdown(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+        self.executor.shutdown(wait=True)
+
+
+async def _changed(changed: asyncio.Event, timeout: float = None):
+    """Wait until a watched TaskEvent changes or timeout seconds pass, then re-arm."""
+    try:
+        await asyncio.wait_for(changed.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    changed.clear()
+
+
+def _write_chunk(part: PartFile, pos: int, chunk: bytes, tracker: ProgressTracker):
+    part.write_at(pos, chunk)
+    tracker.add(len(chunk))
+
+
+def _ingest(store: ContentStore, part_path: str, filepath: str, keys: list, digest: str):
+    store.ingest(part_path, digest)
+    store.remember(keys, digest)
+    store.materialize(digest, filepath)
+
+
+# Global async engine instance
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_async_engine() -> AsyncDirectEngine:
+    """Get or create the global asyncio engine."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AsyncDirectEngine()
+        return _engine
+
+
+def close_async_engine():
+    """Close the global asyncio engine, if one was started; the next get_async_engine() makes a new one."""
+    global _engine
+    with _engine_lock:
+        old, _engine = _engine, None
+    if old is not None:
+        old.close()
+
+
+atexit.register(close_async_engine)
+
+
+def runs_on_loop(url: str, backend: str = None) -> bool:
+    """True if download() runs url on the shared event loop rather than on the calling thread."""
+    router = get_router()
+    backend = backend or router.route(url)
+    return backend == DIRECT or (backend != STREAMING and router.handler(backend) is None)
+
+
+def download(url: str, download_path: str, quality: str = "Best", media_format: str = "MP4", progress_hook=None,
+             cancel_event: threading.Event = None, pause_event: threading.Event = None, backend: str = None,
+             task_key=None, **options) -> bool:
+    """Drop-in replacement for engine.download that runs direct files on the shared event loop.
+
+    Streaming URLs still go through yt-dlp on the calling thread, plugin backends
+    through their own handler. Direct transfers wait on the loop while `pause_event` is set.
+    `backend` is the URL's route when the caller already classified it; `task_key` is as for
+    engine.download.
+    """
+    backend = backend or get_router().route(url)
+    if backend == STREAMING:
+        streaming_options = {k: v for k, v in options.items() if k in STREAMING_OPTIONS}
+        return download_streaming(url, download_path, quality, media_format, progress_hook,
+                                  cancel_event=cancel_event, task_key=task_key, **streaming_options)
+    if backend != DIRECT and get_router().handler(backend):
+        return get_router().handler(backend)(url, download_path, quality, media_format, progress_hook, **options)
+    return get_async_engine().submit(url, download_path, progress_hook, cancel_event=cancel_event,
+                                     pause_event=pause_event, task_key=task_key, **options).result()
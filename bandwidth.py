@@ -0,0 +1,130 @@
+"""
+Bandwidth Governor
+Token-bucket rate limiting shared by every active download, with optional
+per-host and per-task sub-limits that can be changed while transfers run.
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from metrics import get_metrics
+
+
+MIN_CHUNK_SIZE = 16384  # Smallest read size used while throttled
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate` bytes/second (0 = unlimited)."""
+
+    def __init__(self, rate: float = 0):
+        self.rate = float(rate)
+        self.tokens = self.rate
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float):
+        """Change the rate; takes effect for the next reserve()."""
+        with self._lock:
+            self._refill()
+            self.rate = float(rate)
+            self.tokens = min(self.tokens, self.rate)
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate > 0:
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, nbytes: int) -> float:
+        """Take nbytes worth of tokens and return how long the caller must wait."""
+        with self._lock:
+            if self.rate <= 0:
+                return 0.0
+            self._refill()
+            self.tokens -= nbytes
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class BandwidthGovernor:
+    """Global bucket plus per-host and per-task buckets; a transfer waits on all that apply."""
+
+    def __init__(self, global_rate: float = 0):
+        self.global_bucket = TokenBucket(global_rate)
+        self._hosts = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self.metrics = get_metrics()  # Every received byte passes through reserve()
+
+    def set_global_limit(self, rate: float):
+        """Cap total throughput in bytes/second (0 removes the cap)."""
+        self.global_bucket.set_rate(rate)
+
+    def set_host_limit(self, host: str, rate: float):
+        """Cap throughput to one host in bytes/second (0 removes the cap)."""
+        self._set_limit(self._hosts, (host or "").lower(), rate)
+
+    def set_task_limit(self, task_key, rate: float):
+        """Cap throughput of one task in bytes/second (0 removes the cap)."""
+        self._set_limit(self._tasks, task_key, rate)
+
+    def _set_limit(self, buckets: dict, key, rate: float):
+        with self._lock:
+            if rate and rate > 0:
+                if key in buckets:
+                    buckets[key].set_rate(rate)
+                else:
+                    buckets[key] = TokenBucket(rate)
+            else:
+                buckets.pop(key, None)
+
+    def _buckets_for(self, host: str = None, task_key=None) -> list:
+        with self._lock:
+            buckets = [self.global_bucket]
+            if host and host.lower() in self._hosts:
+                buckets.append(self._hosts[host.lower()])
+            if task_key is not None and task_key in self._tasks:
+                buckets.append(self._tasks[task_key])
+        return buckets
+
+    def reserve(self, nbytes: int, host: str = None, task_key=None) -> float:
+        """Account for nbytes just transferred and return how long the caller must wait."""
+        self.metrics.transferred(nbytes, host, task_key)
+        return max(b.reserve(nbytes) for b in self._buckets_for(host, task_key))
+
+    def throttle(self, nbytes: int, host: str = None, task_key=None):
+        """Account for nbytes just transferred, sleeping as long as the tightest limit requires."""
+        wait = self.reserve(nbytes, host, task_key)
+        if wait > 0:
+            time.sleep(wait)
+
+    def chunk_size(self, default: int, host: str = None, task_key=None) -> int:
+        """Shrink reads under tight limits so throttling stays smooth instead of bursty."""
+        rates = [b.rate for b in self._buckets_for(host, task_key) if b.rate > 0]
+        if not rates:
+            return default
+        return max(MIN_CHUNK_SIZE, min(default, int(min(rates) // 4)))
+
+    @contextmanager
+    def task_scope(self, task_key, rate: float = 0):
+        """Register a task's limit for the duration of its transfer."""
+        if rate:
+            self.set_task_limit(task_key, rate)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._tasks.pop(task_key, None)
+
+
+# Global governor instance
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def get_governor() -> BandwidthGovernor:
+    """Get or create the global bandwidth governor."""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = BandwidthGovernor()
+        return _governor
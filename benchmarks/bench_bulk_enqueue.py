@@ -0,0 +1,49 @@
+"""
+Time and peak memory of streaming a large URL list into the download queue,
+optionally with the SQLite journal open. The list is generated on the fly,
+spread over a few hosts, with a comment line every thousand URLs.
+
+    python benchmarks/bench_bulk_enqueue.py [count] [--journal]
+"""
+
+import os
+import sys
+import time
+import resource
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import queue_system
+
+
+def lines(count: int):
+    for i in range(count):
+        if i % 1000 == 0:
+            yield "# batch %d\n" % (i // 1000)
+        yield f"https://cdn{i % 3}.bench.invalid/files/{i:07d}/part-{i}.bin\n"
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    count = int(args[0]) if args else 1000000
+    if "--journal" in sys.argv:
+        queue_system.open_journal(os.path.join(tempfile.mkdtemp(), "queue.sqlite3"))
+
+    t0 = time.perf_counter()
+    added = queue_system.add_bulk(lines(count))
+    elapsed = time.perf_counter() - t0
+
+    t1 = time.perf_counter()
+    queue_system.get_status_snapshot()
+    snapshot = time.perf_counter() - t1
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"queued:   {added}")
+    print(f"elapsed:  {elapsed:.2f} s ({added / elapsed:,.0f} URLs/s)")
+    print(f"snapshot: {snapshot * 1000:.2f} ms (first after the load)")
+    print(f"peak RSS: {peak:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Enqueue-to-start latency of the download queue, with a no-op download backend.
+Each round enqueues one task on an idle pool and measures until the backend
+is entered, which is the delay a user sees after pasting a URL.
+
+    python benchmarks/bench_queue_latency.py [rounds]
+"""
+
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import queue_system
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    started = threading.Event()
+    entered = []
+
+    def backend(url, path, quality, media_format, hook, **options):
+        entered.append(time.perf_counter())
+        started.set()
+
+    queue_system._download_backend = backend
+    queue_system.start_workers(os.devnull, workers=4)
+    time.sleep(0.1)  # Let the workers go idle
+
+    latencies = []
+    for i in range(rounds):
+        started.clear()
+        t0 = time.perf_counter()
+        queue_system.add_to_queue(f"http://bench{i % 8}.invalid/file{i}")
+        started.wait(5)
+        latencies.append(entered[-1] - t0)
+        time.sleep(0.002)
+    queue_system.shutdown(timeout=5)
+
+    latencies.sort()
+    print(f"rounds: {rounds}")
+    print(f"median: {latencies[len(latencies) // 2] * 1000:.3f} ms")
+    print(f"p99:    {latencies[int(len(latencies) * 0.99) - 1] * 1000:.3f} ms")
+    print(f"max:    {latencies[-1] * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Per-item YoutubeDL setup cost: a fresh instance per task versus a pooled one.
+No network access; each item only constructs/checks out an instance and runs
+format selection on a synthetic info dict, which is what every task pays for
+before the first byte is fetched.
+
+    python benchmarks/bench_ydl_pool.py [items]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp
+from ydl_pool import YdlPool
+
+
+OPTS = {
+    "outtmpl": "%(title)s_%(height)sp.%(ext)s",
+    "quiet": True,
+    "no_warnings": True,
+    "format": "bestvideo+bestaudio/best",
+    "merge_output_format": "mp4",
+    "concurrent_fragment_downloads": 32,
+    "http_chunk_size": 2097152,
+}
+
+
+def _noop(_):
+    pass
+
+
+def _task(ydl: yt_dlp.YoutubeDL):
+    ydl.build_format_selector(OPTS["format"])
+
+
+def fresh(items: int) -> float:
+    start = time.perf_counter()
+    for _ in range(items):
+        with yt_dlp.YoutubeDL(dict(OPTS, progress_hooks=[_noop])) as ydl:
+            _task(ydl)
+    return time.perf_counter() - start
+
+
+def pooled(items: int) -> float:
+    pool = YdlPool()
+    start = time.perf_counter()
+    for _ in range(items):
+        with pool.checkout(OPTS, [_noop]) as ydl:
+            _task(ydl)
+    elapsed = time.perf_counter() - start
+    pool.close()
+    return elapsed
+
+
+if __name__ == "__main__":
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    before, after = fresh(items), pooled(items)
+    print(f"{items} items")
+    print(f"fresh instance : {before / items * 1000:8.2f} ms/item")
+    print(f"pooled instance: {after / items * 1000:8.2f} ms/item")
+    print(f"speedup        : {before / after:8.1f}x")
@@ -0,0 +1,189 @@
+"""
+Command Line Interface
+`serve` runs the download queue headless (see daemon.py); the other commands
+are clients of a running daemon's JSON API.
+
+    python main.py serve [--dir PATH] [--host ADDR] [--port N] [--workers N] [--file LIST] [--exit-when-idle]
+                         [--archive] [URL ...]
+    python main.py add URL ... [--quality 720p] [--format MP4] [--priority high]
+    python main.py bulk FILE|-
+    python main.py status [--json]
+    python main.py pause|resume|cancel [TASK_ID]
+    python main.py priority TASK_ID high|normal|low
+    python main.py watch
+"""
+
+import os
+import sys
+import json
+import argparse
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from daemon import API_HOST, API_PORT, DOWNLOAD_PATH
+
+
+def _api_url(args, path: str) -> str:
+    return f"http://{args.host}:{args.port}{path}"
+
+
+def _request(args, path: str, data=None, body=None, content_type: str = "application/json", length: int = None):
+    """Call the daemon and return its decoded JSON reply; exits with the API's error message on failure.
+
+    `body` may be bytes or an open binary file of `length` bytes (sent as it is read).
+    """
+    if data is not None:
+        body = json.dumps(data).encode()
+    request = urllib.request.Request(_api_url(args, path), data=body, method="POST" if body is not None else "GET")
+    if body is not None:
+        request.add_header("Content-Type", content_type)
+        request.add_header("Content-Length", str(len(body) if length is None else length))
+    try:
+        with urllib.request.urlopen(request, timeout=args.timeout) as response:
+            return json.loads(response.read() or b"null")
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.loads(e.read()).get("error", e.reason)
+        except ValueError:
+            message = e.reason
+        sys.exit(f"Error: {message}")
+    except urllib.error.URLError as e:
+        sys.exit(f"Error: no daemon at {args.host}:{args.port} ({e.reason}); start one with `main.py serve`")
+
+
+def cmd_serve(args) -> int:
+    from daemon import run
+    failed = run(args.dir, args.port, args.workers, args.urls, args.file, args.exit_when_idle, not args.no_journal,
+                 args.archive, args.host)
+    return 1 if failed and args.exit_when_idle else 0
+
+
+def cmd_add(args) -> int:
+    reply = _request(args, "/tasks", {"urls": args.urls, "quality": args.quality, "format": args.format,
+                                      "priority": args.priority})
+    print(" ".join(str(task_id) for task_id in reply["ids"]))
+    return 0
+
+
+def cmd_bulk(args) -> int:
+    query = "?" + urllib.parse.urlencode({"quality": args.quality, "format": args.format, "priority": args.priority})
+    if args.file == "-":
+        reply = _request(args, "/tasks/bulk" + query, body=sys.stdin.buffer.read(), content_type="text/plain")
+    else:
+        with open(args.file, "rb") as f:
+            reply = _request(args, "/tasks/bulk" + query, body=f, content_type="text/plain",
+                             length=os.path.getsize(args.file))
+    print(reply["queued"])
+    return 0
+
+
+def cmd_status(args) -> int:
+    status = _request(args, "/status")
+    if args.json:
+        print(json.dumps(status, indent=2))
+        return 0
+    print(f"{status['queue_size']} queued, {len(status['running'])} running"
+          f"{' (paused)' if status['paused'] else ''}  {status['speed']}")
+    for task in status["running"]:
+        print(f"  [{task['id']}] {task['percent']:>6} {task['speed']:>12}  {task['title']}")
+    for task in status["queued"][:10]:
+        retry = f" retry {task['attempts']}" if task["attempts"] else ""
+        print(f"  [{task['id']}] queued{retry}  {task['title']}")
+    for host, health in status["hosts"].items():
+        if health["state"] != "closed":
+            print(f"  {host}: breaker {health['state']} after {health['failures']} failures")
+    return 0
+
+
+def _control(action: str):
+    def command(args) -> int:
+        path = f"/tasks/{args.task_id}/{action}" if args.task_id is not None else f"/{action}"
+        _request(args, path, {})
+        return 0
+    return command
+
+
+def cmd_priority(args) -> int:
+    _request(args, f"/tasks/{args.task_id}/priority", {"priority": args.level})
+    return 0
+
+
+def cmd_watch(args) -> int:
+    """Print task events as they stream in, one line each."""
+    try:
+        with urllib.request.urlopen(_api_url(args, "/events")) as response:
+            for line in response:
+                if line.startswith(b"data: "):
+                    event = json.loads(line[6:])
+                    if args.json:
+                        print(json.dumps(event), flush=True)
+                    elif event["event"] == "queued":
+                        print(f"queued {event['count']} from id {event['first_id']}", flush=True)
+                    elif "id" in event:
+                        detail = event.get("percent", "") if event["event"] == "progress" else event.get("error") or ""
+                        print(f"[{event['id']}] {event['event']:<9} {detail}  {event.get('title', '')}", flush=True)
+    except KeyboardInterrupt:
+        pass
+    except urllib.error.URLError as e:
+        sys.exit(f"Error: no daemon at {args.host}:{args.port} ({e.reason})")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="main.py", description="Multimedia Download Manager (headless)")
+    parser.add_argument("--host", default=API_HOST, help="daemon address (default %(default)s)")
+    parser.add_argument("--port", type=int, default=API_PORT, help="daemon port (default %(default)s)")
+    parser.add_argument("--timeout", type=float, default=60.0, help=argparse.SUPPRESS)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="run the download queue without a GUI")
+    serve.add_argument("urls", nargs="*", help="URLs to queue at startup")
+    serve.add_argument("--dir", default=DOWNLOAD_PATH, help="download directory (default %(default)s)")
+    # SUPPRESS keeps `main.py --port N serve` working: a subparser default would override the global option
+    serve.add_argument("--host", default=argparse.SUPPRESS, help=f"address to listen on (default {API_HOST})")
+    serve.add_argument("--port", type=int, default=argparse.SUPPRESS, help=f"port to listen on (default {API_PORT})")
+    serve.add_argument("--workers", type=int, help="concurrent downloads")
+    serve.add_argument("--file", help="text file of URLs to queue at startup")
+    serve.add_argument("--exit-when-idle", action="store_true", help="exit once nothing is queued or running")
+    serve.add_argument("--no-journal", action="store_true", help="do not persist or restore the queue")
+    serve.add_argument("--archive", action="store_true", help="skip items already in the directory's archive")
+    serve.set_defaults(func=cmd_serve)
+
+    for name, func, help in (("add", cmd_add, "queue URLs"), ("bulk", cmd_bulk, "queue a file of URLs")):
+        sub = commands.add_parser(name, help=help)
+        if name == "add":
+            sub.add_argument("urls", nargs="+")
+        else:
+            sub.add_argument("file", help="one URL per line; - reads standard input")
+        sub.add_argument("--quality", default="Best")
+        sub.add_argument("--format", default="MP4", help="video or audio format, e.g. MKV or MP3 (default %(default)s)")
+        sub.add_argument("--priority", default="normal", choices=("high", "normal", "low"))
+        sub.set_defaults(func=func)
+
+    status = commands.add_parser("status", help="show the queue")
+    status.add_argument("--json", action="store_true")
+    status.set_defaults(func=cmd_status)
+
+    for action in ("pause", "resume", "cancel"):
+        sub = commands.add_parser(action, help=f"{action} one task, or every running task")
+        sub.add_argument("task_id", nargs="?", type=int)
+        sub.set_defaults(func=_control(action))
+
+    priority = commands.add_parser("priority", help="change a queued task's priority")
+    priority.add_argument("task_id", type=int)
+    priority.add_argument("level", choices=("high", "normal", "low"))
+    priority.set_defaults(func=cmd_priority)
+
+    watch = commands.add_parser("watch", help="stream task events")
+    watch.add_argument("--json", action="store_true")
+    watch.set_defaults(func=cmd_watch)
+    return parser
+
+
+def main(argv=None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if argv and argv[0] == "--headless":
+        argv[0] = "serve"
+    args = build_parser().parse_args(argv)
+    return args.func(args)
@@ -0,0 +1,144 @@
+"""
+Content-Addressed Download Store
+Finished files are stored once by SHA-256 under <download path>/.smile_store
+and exposed under their requested names via reflinks, hardlinks or copies.
+"""
+
+import os
+import sys
+import json
+import errno
+import shutil
+import threading
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+
+STORE_DIRNAME = ".smile_store"
+INDEX_FILENAME = "index.jsonl"
+FICLONE = 0x40049409  # Linux copy-on-write clone ioctl
+
+
+def _reflink(src: str, dst: str) -> bool:
+    """Try a copy-on-write clone (btrfs, XFS, ...). Returns False if unsupported."""
+    if not HAS_FCNTL or not sys.platform.startswith("linux"):
+        return False
+    try:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return True
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+
+
+class ContentStore:
+    """Objects keyed by digest plus an append-only index of remote identities -> digest."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.index_path = os.path.join(root, INDEX_FILENAME)
+        self._index = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self._index[entry["key"]] = entry["digest"]
+                    except (ValueError, KeyError):
+                        continue
+        except OSError:
+            pass
+
+    @staticmethod
+    def remote_keys(url: str, etag: str = None, last_modified: str = None, size: int = 0) -> list:
+        """Identities under which a remote file is indexed (most specific first).
+
+        Without an ETag or Last-Modified there is nothing to tell a changed file from the
+        stored one, so such a response gets no keys and is always fetched.
+        """
+        validator = etag or last_modified
+        keys = [f"url:{url}|{validator}|{size}"] if validator else []
+        if etag and not etag.startswith("W/") and size:
+            keys.append(f"etag:{etag}|{size}")
+        return keys
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def has(self, digest: str) -> bool:
+        return bool(digest) and os.path.isfile(self.object_path(digest))
+
+    def lookup(self, keys: list):
+        """Return the digest of a stored object matching any of keys, or None."""
+        with self._lock:
+            for key in keys:
+                digest = self._index.get(key)
+                if digest and self.has(digest):
+                    return digest
+        return None
+
+    def remember(self, keys: list, digest: str):
+        """Index keys -> digest so future downloads can short-circuit."""
+        with self._lock:
+            new = [k for k in keys if self._index.get(k) != digest]
+            if not new:
+                return
+            with open(self.index_path, "a") as f:
+                for key in new:
+                    self._index[key] = digest
+                    f.write(json.dumps({"key": key, "digest": digest}) + "\n")
+
+    def ingest(self, src_path: str, digest: str) -> str:
+        """Move a finished file into the store, or drop it if that content is already stored."""
+        obj = self.object_path(digest)
+        if os.path.isfile(obj):
+            os.remove(src_path)
+            return obj
+        os.makedirs(os.path.dirname(obj), exist_ok=True)
+        tmp = obj + ".tmp"
+        os.replace(src_path, tmp)
+        os.chmod(tmp, 0o444)  # Shared by every name linked to it
+        os.replace(tmp, obj)
+        return obj
+
+    def materialize(self, digest: str, dest_path: str) -> str:
+        """Expose a stored object at dest_path (reflink, then hardlink, then copy)."""
+        obj = self.object_path(digest)
+        if os.path.lexists(dest_path):
+            os.remove(dest_path)
+        if _reflink(obj, dest_path):
+            return "reflink"
+        try:
+            os.link(obj, dest_path)
+            return "hardlink"
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                raise
+        shutil.copyfile(obj, dest_path)
+        return "copy"
+
+
+# Stores by root directory
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_content_store(download_path: str) -> ContentStore:
+    """Get or create the store that lives under download_path."""
+    root = os.path.join(os.path.abspath(download_path), STORE_DIRNAME)
+    with _stores_lock:
+        if root not in _stores:
+            _stores[root] = ContentStore(root)
+        return _stores[root]
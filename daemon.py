@@ -0,0 +1,337 @@
+"""
+Headless Daemon
+Runs the download queue without a GUI and serves a JSON API on localhost for
+submitting and controlling jobs. Task events are streamed to clients as
+Server-Sent Events, and the Prometheus metrics are served on the same port.
+
+    GET  /status                     queue, running and recent tasks, host health
+    GET  /tasks/<id>                 one queued or running task
+    POST /tasks                      {"url" or "urls", "quality", "format", "priority", "options"}
+                                     (options: segments, rate_limit, dedupe, sha256, fast_hash, mirrors)
+    POST /tasks/bulk                 text body, one URL per line (?quality=&format=&priority=)
+    POST /tasks/<id>/pause|resume|cancel
+    POST /tasks/<id>/priority        {"priority": "high" | "normal" | "low"}
+    POST /pause, /resume, /cancel    every running task
+    GET  /events                     text/event-stream of task events
+    GET  /metrics                    Prometheus text
+"""
+
+import os
+import json
+import signal
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import queue_system
+from engine import AUDIO_FORMATS, DIRECT_OPTIONS, STREAMING_OPTIONS, VIDEO_FORMATS, quality_height
+from metrics import get_metrics
+from scheduler import HIGH, NORMAL, LOW
+
+
+API_HOST = "127.0.0.1"
+API_PORT = 9465
+DOWNLOAD_PATH = os.path.join(os.path.expanduser("~"), "Downloads")
+EVENT_BACKLOG = 1000  # Events buffered per stream client; a slow client loses the oldest
+KEEPALIVE = 15.0  # Seconds between comment lines on an idle event stream
+SHUTDOWN_TIMEOUT = 10.0  # Seconds to wait for workers on SIGINT/SIGTERM
+MAX_JSON_BODY = 16777216  # 16MB; larger URL lists go to /tasks/bulk
+
+PRIORITIES = {"high": HIGH, "normal": NORMAL, "low": LOW}
+TASK_OPTIONS = frozenset(DIRECT_OPTIONS + STREAMING_OPTIONS)  # Keys accepted in a task's "options"
+MEDIA_FORMATS = {name.lower(): name for name in (*VIDEO_FORMATS, *AUDIO_FORMATS)}  # Accepted "format" values
+
+
+class Subscriber:
+    """One stream client's buffered events; `ready` is set when there are new ones."""
+
+    __slots__ = ("events", "ready")
+
+    def __init__(self, backlog: int):
+        self.events = deque(maxlen=backlog)
+        self.ready = threading.Event()
+
+
+class EventHub:
+    """Fans task events out to stream clients, each with a bounded buffer."""
+
+    def __init__(self, backlog: int = EVENT_BACKLOG):
+        self.backlog = backlog
+        self._clients = set()
+        self._lock = threading.Lock()
+
+    def publish(self, event: dict):
+        """queue_system listener: buffer event for every client (never blocks on a client)."""
+        with self._lock:
+            for client in self._clients:
+                client.events.append(event)
+                client.ready.set()
+
+    def subscribe(self) -> Subscriber:
+        client = Subscriber(self.backlog)
+        with self._lock:
+            self._clients.add(client)
+        return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _priority(value) -> int:
+    if value is None:
+        return NORMAL
+    if isinstance(value, str) and value.lower() in PRIORITIES:
+        return PRIORITIES[value.lower()]
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    if value in (HIGH, NORMAL, LOW):
+        return value
+    raise ApiError(400, f"Unknown priority: {value}")
+
+
+def _quality(value) -> str:
+    if value is None:
+        return "Best"
+    try:
+        quality_height(value)
+    except ValueError:
+        raise ApiError(400, f"Unknown quality: {value} (use Best or a height such as 720p)")
+    return value
+
+
+def _media_format(value) -> str:
+    if value is None:
+        return "MP4"
+    media_format = MEDIA_FORMATS.get(str(value).lower())
+    if media_format is None:
+        raise ApiError(400, f"Unknown format: {value} (e.g. MP4, MKV, MP3, FLAC)")
+    return media_format
+
+
+def _options(value) -> dict:
+    if not value:
+        return {}
+    if not isinstance(value, dict):
+        raise ApiError(400, "options must be a JSON object")
+    unknown = sorted(set(value) - TASK_OPTIONS)
+    if unknown:
+        raise ApiError(400, f"Unknown options: {', '.join(unknown)} (known: {', '.join(sorted(TASK_OPTIONS))})")
+    return value
+
+
+def _body_lines(rfile, length: int):
+    """Lines of a request body of `length` bytes, read as they arrive."""
+    while length > 0:
+        line = rfile.readline(min(length, 65536))
+        if not line:
+            return
+        length -= len(line)
+        yield line.decode("utf-8", errors="replace")
+
+
+def status() -> dict:
+    queued, running, completed, speed, transcode = queue_system.get_status_snapshot()
+    return {
+        "queued": queued, "running": running, "completed": completed, "speed": speed,
+        "queue_size": queue_system.get_queue_size(), "paused": queue_system.pause_flag,
+        "hosts": queue_system.get_host_health(), "transcode": transcode,
+    }
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """Routes the JSON API; the EventHub is set on the server as `events`."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, data, status: int = 200):
+        self._send(status, json.dumps(data, default=str).encode())
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_JSON_BODY:
+            raise ApiError(413, "Body too large; post URL lists to /tasks/bulk")
+        try:
+            data = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            raise ApiError(400, "Body is not valid JSON")
+        if not isinstance(data, dict):
+            raise ApiError(400, "Body must be a JSON object")
+        return data
+
+    def _route(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        return parts, query
+
+    def do_GET(self):
+        parts, _ = self._route()
+        try:
+            if parts == ["status"]:
+                self._json(status())
+            elif len(parts) == 2 and parts[0] == "tasks":
+                task = queue_system.get_task(self._task_id(parts[1]))
+                if task is None:
+                    raise ApiError(404, "No queued or running task with that id")
+                self._json(task)
+            elif parts == ["events"]:
+                self._stream_events()
+            elif parts == ["metrics"]:
+                self._send(200, get_metrics().render().encode(), "text/plain; version=0.0.4; charset=utf-8")
+            else:
+                raise ApiError(404, "Not found")
+        except ApiError as e:
+            self._json({"error": str(e)}, e.status)
+
+    def do_POST(self):
+        parts, query = self._route()
+        try:
+            if parts == ["tasks"]:
+                data = self._read_json()
+                urls = data.get("urls") or ([data["url"]] if data.get("url") else [])
+                if not isinstance(urls, list) or not all(isinstance(u, str) for u in urls):
+                    raise ApiError(400, "url must be a string and urls a list of strings")
+                if not urls:
+                    raise ApiError(400, "Give a url or a list of urls")
+                options = _options(data.get("options"))
+                args = (_quality(data.get("quality")), _media_format(data.get("format")),
+                        _priority(data.get("priority")))
+                ids = [queue_system.add_to_queue(u, *args, **options) for u in urls if u and u.strip()]
+                self._json({"ids": ids}, 201)
+            elif parts == ["tasks", "bulk"]:
+                if "Content-Length" not in self.headers:
+                    raise ApiError(411, "Send the URL list with a Content-Length")
+                length = int(self.headers["Content-Length"])
+                added = queue_system.add_bulk(_body_lines(self.rfile, length), _quality(query.get("quality")),
+                                              _media_format(query.get("format")), _priority(query.get("priority")))
+                self._json({"queued": added}, 201)
+            elif len(parts) == 3 and parts[0] == "tasks":
+                self._task_action(self._task_id(parts[1]), parts[2])
+            elif parts in (["pause"], ["resume"], ["cancel"]):
+                getattr(queue_system, parts[0])()
+                self._json({"ok": True})
+            else:
+                raise ApiError(404, "Not found")
+        except ApiError as e:
+            self._json({"error": str(e)}, e.status)
+        except (TypeError, ValueError) as e:
+            self._json({"error": str(e)}, 400)
+
+    def _task_id(self, text: str) -> int:
+        try:
+            return int(text)
+        except ValueError:
+            raise ApiError(400, f"Bad task id: {text}")
+
+    def _task_action(self, task_id: int, action: str):
+        if action == "priority":
+            ok = queue_system.set_priority(task_id, _priority(self._read_json().get("priority")))
+        elif action in ("pause", "resume", "cancel"):
+            ok = getattr(queue_system, action + "_task")(task_id)
+        else:
+            raise ApiError(404, "Not found")
+        if not ok:
+            raise ApiError(409 if action == "priority" else 404, "Task already started or finished")
+        self._json({"ok": True})
+
+    def _stream_events(self):
+        hub = self.server.events
+        client = hub.subscribe()
+        events, ready = client.events, client.ready
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            while not self.server.stopping:
+                if not ready.wait(KEEPALIVE):
+                    self.wfile.write(b": keepalive\n\n")
+                ready.clear()
+                while events:
+                    event = events.popleft()
+                    self.wfile.write(f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n".encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            hub.unsubscribe(client)
+
+
+def start_api(port: int = API_PORT, host: str = API_HOST) -> ThreadingHTTPServer:
+    """Serve the JSON API from a daemon thread and feed it queue_system's task events."""
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    server.daemon_threads = True
+    server.events = EventHub()
+    server.stopping = False
+    queue_system.add_listener(server.events.publish)
+    threading.Thread(target=server.serve_forever, name="api-http", daemon=True).start()
+    return server
+
+
+def stop_api(server: ThreadingHTTPServer):
+    server.stopping = True
+    queue_system.remove_listener(server.events.publish)
+    server.events.publish({"event": "shutdown"})  # Wakes stream handlers so they see `stopping`
+    server.shutdown()
+    server.server_close()
+
+
+def run(download_path: str = DOWNLOAD_PATH, port: int = API_PORT, workers: int = None, urls=(),
+        url_file: str = None, exit_when_idle: bool = False, journal: bool = True, archive: bool = False,
+        host: str = API_HOST) -> int:
+    """Run the queue headless until SIGINT/SIGTERM (or until idle, with exit_when_idle).
+
+    `urls` and the lines of `url_file` are queued at startup. On a signal, running
+    tasks are cut short and stay in the journal, so the next run resumes them.
+    With `archive`, items already in the download directory's archive are skipped.
+    Returns the number of tasks that failed during this run.
+    """
+    os.makedirs(download_path, exist_ok=True)
+    queue_system.set_use_archive(archive)
+    restored = queue_system.open_journal() if journal else 0
+    server = start_api(port, host)
+    stop = threading.Event()
+    failed = []
+
+    def on_event(event):
+        if event["event"] == "failed":
+            failed.append(event["id"])
+        if exit_when_idle and event["event"] in ("done", "failed", "cancelled") and queue_system.is_idle():
+            stop.set()
+
+    queue_system.add_listener(on_event)
+    queue_system.start_workers(download_path, workers=workers)
+    if urls:
+        queue_system.add_bulk(urls)
+    if url_file:
+        queue_system.add_bulk(url_file)
+    print(f"Serving on http://{server.server_address[0]}:{server.server_address[1]}"
+          f" ({restored} tasks restored, saving to {download_path})", flush=True)
+
+    interrupted = []
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: (interrupted.append(True), stop.set()))
+    if exit_when_idle and queue_system.is_idle():
+        stop.set()
+    stop.wait()
+
+    queue_system.remove_listener(on_event)
+    stop_api(server)
+    queue_system.shutdown(cancel_running=bool(interrupted), timeout=SHUTDOWN_TIMEOUT)
+    return len(failed)
@@ -5,11 +5,34 @@ Enhanced with complete format support and performance optimizations.
 """
 
 import os
+import sys
+import json
+import errno
+import shutil
+import time
+import threading
 import yt_dlp
+from yt_dlp.postprocessor import PostProcessor
+from yt_dlp.utils import DownloadCancelled as _YdlDownloadCancelled, DownloadError, remove_terminal_sequences
 import requests
 from urllib.parse import urlparse
+from transport import get_transport
+from bandwidth import get_governor
+from hashing import FAST_HASH, OrderedHasher, file_digests
+from content_store import ContentStore, get_content_store
+from integrity import IntegrityError, record, verify
+from mirrors import MIN_THROUGHPUT, MirrorSet
+from metadata_cache import get_metadata_cache, info_key
+from ydl_pool import get_ydl_pool
+from fragments import get_fragment_budget
+from transcode import audio_job, get_transcode_stage, merge_job, remux_job
+from format_resolver import CODEC_FAMILIES, get_format_resolver
+from router import DIRECT, STREAMING, get_router
+from archive import DownloadArchive, direct_key, get_archive, streaming_keys
+from metrics import get_metrics
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 
 # Supported streaming domains for yt-dlp
@@ -19,9 +42,31 @@ STREAMING_DOMAINS = (
     "instagram.com", "tiktok.com", "soundcloud.com", "bandcamp.com",
     "reddit.com", "rumble.com", "odysee.com", "kick.com", "spotify.com",
     "ted.com", "bbc.co.uk", "bbc.com", "4chan.org", "mastodon.social",
-    "pixiv.net", "patreon.com", "pornhub.com", "twitch.tv"
+    "pixiv.net", "patreon.com", "pornhub.com",
 )
 
+# Direct download tuning
+CHUNK_SIZE = 4194304  # Largest read; adaptive sizing grows toward this
+MIN_CHUNK_SIZE = 65536  # First and smallest read
+CHUNK_TARGET_SECONDS = 0.25  # Aim for chunks that take about this long to arrive
+MAX_CHUNK_SECONDS = 1.0  # Hand over whatever has arrived after this long
+DEFAULT_SEGMENTS = 4  # Parallel byte ranges per direct file
+MIN_SEGMENT_SIZE = 1048576  # Don't split files into ranges smaller than 1MB
+PART_SUFFIX = ".part"  # In-progress data, renamed on completion
+STATE_SUFFIX = ".part.json"  # Sidecar journal of finished byte ranges
+STATE_SAVE_INTERVAL = 1.0  # Seconds between journal flushes
+_claimed_outputs = set()  # Output paths of direct downloads in flight (see claim_output)
+_claimed_lock = threading.Lock()
+
+DIRECT_OPTIONS = ("segments", "rate_limit", "dedupe", "sha256", "fast_hash", "mirrors")  # Options for download_direct
+# Per-task options that download() forwards to download_streaming as well
+STREAMING_OPTIONS = ("rate_limit", "dedupe", "fast_hash")
+
+# Integrity checks
+CHECKSUM_ALGORITHMS = ("sha256",)  # Always computed while bytes stream
+WRITE_MANIFEST = True  # Append finished downloads to <download path>/manifest.jsonl
+USE_ARCHIVE = False  # Skip items recorded in <download path>/.smile_archive.sqlite3 (see set_use_archive)
+
 # Comprehensive Video Format Support
 VIDEO_FORMATS = {
     # Container formats
@@ -94,18 +139,201 @@ FORMAT_EXTENSIONS = {
 }
 
 
+get_router().register_domains(STREAMING_DOMAINS, STREAMING)
+
+
 def is_streaming_url(url: str) -> bool:
-    """Check if URL is from a supported streaming platform."""
+    """Check if URL is from a supported streaming platform (domain or subdomain match)."""
+    return get_router().route(url) == STREAMING
+
+
+def quality_height(quality: str) -> int:
+    """Height cap for a quality such as "720p" or "720"; None for "Best" or "auto".
+
+    Raises ValueError for anything else.
+    """
+    text = str(quality or "").strip().lower()
+    if text in ("", "best", "auto"):
+        return None
+    digits = text[:-1] if text.endswith("p") else text
+    if not digits.isdigit() or int(digits) == 0:
+        raise ValueError(f"Unknown quality: {quality}")
+    return int(digits)
+
+
+class DownloadCancelled(_YdlDownloadCancelled):
+    """The task's cancel event was set; raised through yt-dlp and out of download()."""
+
+
+def set_use_archive(enabled: bool):
+    """Turn the download archive on or off for downloads that start from now on."""
+    global USE_ARCHIVE
+    USE_ARCHIVE = bool(enabled)
+
+
+def open_archive(download_path: str):
+    """download_path's archive, or None while the archive is off."""
+    return get_archive(download_path) if USE_ARCHIVE else None
+
+
+def _throttled_hook(url: str, progress_hook=None, cancel_event: threading.Event = None, task_key=None):
+    """Wrap a yt-dlp progress hook so received bytes are charged to the bandwidth governor.
+
+    Blocking inside the hook stalls yt-dlp's download loop, which is what enforces the limit.
+    Raising from it is how a set `cancel_event` stops yt-dlp.
+    """
+    task_key = url if task_key is None else task_key
+    host = urlparse(url).hostname
+    governor = get_governor()
+    seen = {}
+    lock = threading.Lock()
+
+    def hook(d):
+        if d.get("status") == "downloading":
+            done = d.get("downloaded_bytes") or 0
+            with lock:
+                key = d.get("filename")
+                delta = done - seen.get(key, 0)
+                seen[key] = done
+            if delta > 0:
+                wait = governor.reserve(delta, host, task_key)
+                if wait > 0:
+                    if cancel_event is not None:
+                        cancel_event.wait(wait)
+                    else:
+                        time.sleep(wait)
+        if cancel_event is not None and cancel_event.is_set():
+            raise DownloadCancelled()
+        if progress_hook:
+            progress_hook(d)
+
+    return hook
+
+
+def _extract_cached(ydl: yt_dlp.YoutubeDL, url: str):
+    """Return the unprocessed info dict for url, extracting only on a cache miss."""
+    cache = get_metadata_cache()
+    info = cache.get(url)
+    if info is None:
+        info = ydl.extract_info(url, download=False, process=False)
+        if info and info.get("_type", "video") == "video":
+            cache.put(url, ydl.sanitize_info(info))
+    return info
+
+
+@contextmanager
+def _recording_errors(ydl: yt_dlp.YoutubeDL):
+    """Collect (message, exception) for each error yt-dlp reports while ignoreerrors hides it.
+
+    yt-dlp reports errors from inside its except blocks, so the exception being handled
+    is the cause of the message; retry.classify() reads its HTTP status from there.
+    """
+    errors = []
+    trouble = ydl.trouble
+
+    def record(message=None, tb=None, is_error=True):
+        if is_error:
+            errors.append((remove_terminal_sequences(message or "").replace("ERROR: ", "", 1), sys.exc_info()[1]))
+        return trouble(message, tb, is_error)
+
+    ydl.trouble = record
     try:
-        parsed = urlparse(url)
-        domain = parsed.netloc.lower().replace("www.", "")
-        return any(d in domain for d in STREAMING_DOMAINS)
-    except Exception:
+        yield errors
+    finally:
+        del ydl.trouble
+
+
+def _process_resolved(ydl: yt_dlp.YoutubeDL, info: dict, handoff: "_TranscodeHandoff", container: str,
+                      max_height: int, media_format: str, audio_format: dict):
+    """Download info with locally resolved format IDs, falling back to the selector string.
+
+    Returns False without downloading if the extracted item is already archived.
+    """
+    if handoff.archive and handoff.archive.contains(info_key(info), handoff.variant):
         return False
+    if info.get("_type", "video") == "video":
+        handoff.resolution = get_format_resolver().resolve(
+            info, container, max_height, CODEC_FAMILIES.get(media_format, ()), audio_only=audio_format is not None)
+    if handoff.resolution is None:
+        ydl.process_ie_result(info, download=True)
+        return True
+    default_selector = ydl.format_selector
+    ydl.format_selector = ydl.build_format_selector(f"{handoff.resolution.selector}/{ydl.params['format']}")
+    try:
+        ydl.process_ie_result(info, download=True)
+    finally:
+        ydl.format_selector = default_selector
+    return True
+
 
+class _TranscodeHandoff(PostProcessor):
+    """Queue FFmpeg work (stream merges, remuxes, audio extraction) on the transcode stage.
+
+    Runs after yt-dlp has moved the raw download into place. Outputs that need no
+    FFmpeg are finalized right away; the rest when their transcode job finishes.
+    `resolution`, when the format resolver picked the streams, says which work is needed.
+    Finalized items are recorded in `archive` under `variant`.
+    """
+
+    def __init__(self, finalize, container: str, audio_format: dict = None, on_error=None,
+                 archive: DownloadArchive = None, variant: str = ""):
+        PostProcessor.__init__(self)
+        self.finalize = finalize
+        self.container = container
+        self.audio_format = audio_format
+        self.on_error = on_error
+        self.archive = archive
+        self.variant = variant
+        self.resolution = None
+
+    def _done(self, key: str, filepath: str):
+        self.finalize(filepath)
+        if self.archive:
+            self.archive.add(key, self.variant, filepath)
+
+    def run(self, info):
+        filepath = info["filepath"]
+        resolution = self.resolution
+        streams = [f.get("filepath") for f in info.get("requested_formats") or ()]
+        if len(streams) > 1 and all(p and os.path.isfile(p) for p in streams) and not os.path.isfile(filepath):
+            job = merge_job(info)
+        elif not os.path.isfile(filepath):
+            return [], info
+        elif self.audio_format and (resolution is None or resolution.transcode):
+            job = audio_job(info, self.audio_format["codec"], self.audio_format["quality"])
+        elif resolution is not None and resolution.remux and info.get("ext") != self.container:
+            job = remux_job(info, self.container)
+        else:
+            self._done(info_key(info), filepath)
+            return [], info
+        key = info_key(info)
+        get_transcode_stage().submit(job, info.get("title") or os.path.basename(filepath),
+                                     lambda output: self._done(key, output), self.on_error)
+        return [], info
+
+
+def download_streaming(url: str, download_path: str, quality: str, media_format: str, progress_hook=None,
+                       rate_limit: float = 0, dedupe: bool = False, fast_hash: bool = False,
+                       cancel_event: threading.Event = None, task_key=None) -> bool:
+    """Download from YouTube and other streaming platforms using yt-dlp with optimizations.
+
+    Raw extraction results for single videos are kept in the metadata cache, so a repeated
+    download feeds the cached info dict to process_ie_result and skips the extractor.
+    Formats are picked locally from the extracted list (see format_resolver), which also
+    decides whether a remux or transcode is needed. Stream merges and audio conversions
+    are queued on the transcode stage, so this returns as soon as the raw streams are on
+    disk. Items in the download path's archive are skipped, before extraction when the
+    video ID can be read from the URL. `task_key` names the task to the bandwidth governor
+    and metrics (default: the URL).
+    """
+    task_key = url if task_key is None else task_key
+    archive = open_archive(download_path)
+    variant = f"{media_format} {quality}"
+    if archive and archive.contains_any(streaming_keys(url), variant):
+        if progress_hook:
+            progress_hook({"status": "finished", "archived": True})
+        return True
 
-def download_streaming(url: str, download_path: str, quality: str, media_format: str, progress_hook=None) -> bool:
-    """Download from YouTube and other streaming platforms using yt-dlp with optimizations."""
     if media_format in VIDEO_FORMATS:
         outtmpl = os.path.join(download_path, "%(title)s_%(height)sp.%(ext)s")
     else:
@@ -117,30 +345,38 @@ def download_streaming(url: str, download_path: str, quality: str, media_format:
         "ignoreerrors": True,
         "noplaylist": False,
         "overwrites": False,
-        "concurrent_fragment_downloads": 32,  # Increased for parallel fragment downloads
         "socket_timeout": 30,
         "retries": 5,
         "retry_sleep": 2,
-        "http_chunk_size": 2097152,  # 2MB chunks for optimal transfer speed
         "bidi_workaround": False,
         "quiet": False,
         "no_warnings": False,
         "extract_flat": False,
+        # Required by _TranscodeHandoff: with this set yt-dlp leaves the separate streams unmerged,
+        # so merges run on the transcode stage instead of blocking this download thread
         "allow_unplayable_formats": True,
         "prefer_insecure": False,
         "youtube_include_dash_manifest": True,
         "trim_file_name": 200,
     }
 
-    if progress_hook:
-        ydl_opts["progress_hooks"] = [progress_hook]
+    # Hooks are per task; they are attached to a pooled instance, not baked into its options.
+    # concurrent_fragment_downloads and http_chunk_size come from the fragment budget.
+    algorithms = CHECKSUM_ALGORITHMS + ((FAST_HASH,) if fast_hash else ())
+    store = get_content_store(download_path) if dedupe else None
+    started = time.time()
+    audio_format = None
+    max_height = None
 
     if media_format in VIDEO_FORMATS:
-        if quality == "Best":
+        try:
+            max_height = quality_height(quality)
+        except ValueError:
+            pass  # Unrecognised quality: take the best available
+        if max_height is None:
             ydl_opts["format"] = VIDEO_FORMATS.get(media_format, "bestvideo+bestaudio/best")
         else:
-            height = quality.replace("p", "")
-            ydl_opts["format"] = f"bestvideo[height<={height}]+bestaudio/best"
+            ydl_opts["format"] = f"bestvideo[height<={max_height}]+bestaudio/best"
         
         # Set merge format based on selected format
         merge_formats = {
@@ -149,77 +385,744 @@ def download_streaming(url: str, download_path: str, quality: str, media_format:
             "ASF": "asf", "WMV": "wmv", "VOB": "vob", "OGV": "ogv",
             "MPEG": "mpeg", "MPG": "mpg", "HEVC": "mp4", "H264": "mp4",
         }
-        ydl_opts["merge_output_format"] = merge_formats.get(media_format, "mp4")
+        ydl_opts["merge_output_format"] = container = merge_formats.get(media_format, "mp4")
     else:
         ydl_opts["format"] = "bestaudio/best"
-        format_config = AUDIO_FORMATS.get(media_format, AUDIO_FORMATS["MP3"])
-        ydl_opts["postprocessors"] = [{
-            "key": "FFmpegExtractAudio",
-            "preferredcodec": format_config["codec"],
-            "preferredquality": format_config["quality"]
-        }]
+        audio_format = AUDIO_FORMATS.get(media_format, AUDIO_FORMATS["MP3"])
+        container = FORMAT_EXTENSIONS.get(media_format, "mp3")
+
+    def on_transcode_error(error):
+        if progress_hook:
+            try:
+                progress_hook({"status": "error", "error": f"Transcode failed: {error}"})
+            except Exception:
+                pass
+
+    handoff = _TranscodeHandoff(
+        lambda filepath: _finalize_output(url, download_path, filepath, algorithms, started, store),
+        container, audio_format, on_transcode_error, archive, variant)
 
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
+        with get_governor().task_scope(task_key, rate_limit), get_fragment_budget().task_scope(url) as fragments:
+            progress_hooks = [fragments.observe, _throttled_hook(url, progress_hook, cancel_event, task_key)]
+            with get_ydl_pool().checkout(ydl_opts, progress_hooks,
+                                         post_processors=[(handoff, "after_move")]) as ydl:
+                fragments.attach(ydl.params)
+                with _recording_errors(ydl) as errors:
+                    info = _extract_cached(ydl, url)
+                    if info is not None and not _process_resolved(ydl, info, handoff, container, max_height,
+                                                                   media_format, audio_format):
+                        if progress_hook:
+                            progress_hook({"status": "finished", "archived": True})
+        # Playlists skip entries that fail; a single item, or a playlist that could not be read, fails
+        if errors and (info is None or info.get("_type", "video") == "video"):
+            message, cause = errors[0]
+            raise DownloadError(message, (type(cause), cause, cause.__traceback__) if cause else None)
         return True
+    except DownloadCancelled:
+        raise
     except Exception as e:
         if progress_hook:
-            progress_hook({"status": "error", "error": str(e)})
+            progress_hook({"status": "error", "error": str(e), "exception": e})
         return False
 
 
-def download_direct(url: str, download_path: str, progress_hook=None) -> bool:
-    """Download direct file (images, PDFs, etc.) via HTTP with parallel optimization."""
+class ProgressTracker:
+    """Combine byte counts from one or more transfers into a single percentage.
+
+    Every chunk is also charged to the bandwidth governor under the URL's host and
+    `task_key` (default: the URL), unless `throttled` is False because the caller waits on
+    the governor itself. Setting `cancel_event` stops the transfers at their next socket
+    read or throttle wait.
+    """
+
+    def __init__(self, url: str, total_size: int, progress_hook=None, already_done: int = 0,
+                 throttled: bool = True, cancel_event: threading.Event = None, task_key=None):
+        self.url = url
+        self.task_key = url if task_key is None else task_key
+        self.cancel_event = cancel_event
+        self.throttled = throttled
+        self.host = urlparse(url).hostname
+        self.total_size = total_size
+        self.progress_hook = progress_hook
+        self.downloaded = already_done
+        self.received = 0
+        self.start_time = time.time()
+        self.stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def stopped(self) -> bool:
+        return self.stop_event.is_set() or self.cancelled
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    @property
+    def chunk_size(self) -> int:
+        return get_governor().chunk_size(CHUNK_SIZE, self.host, self.task_key)
+
+    def add(self, nbytes: int):
+        """Record received bytes, wait out any bandwidth limit and report combined progress."""
+        if self.throttled:
+            wait = get_governor().reserve(nbytes, self.host, self.task_key)
+            if wait > 0:
+                # Wake early if the task is cancelled or a sibling range failed
+                (self.cancel_event or self.stop_event).wait(wait)
+        if self.cancelled:
+            raise DownloadCancelled()
+        with self._lock:
+            self.downloaded += nbytes
+            self.received += nbytes
+            downloaded, received = self.downloaded, self.received
+        if self.progress_hook:
+            elapsed = time.time() - self.start_time
+            speed_mbps = (received / (1024 * 1024)) / max(elapsed, 0.1)
+            progress = {
+                "status": "downloading",
+                "downloaded_bytes": downloaded,
+                "total_bytes": self.total_size or None,
+                "_speed_str": f"{speed_mbps:.2f} MB/s"
+            }
+            if self.total_size:
+                progress["_percent_str"] = f"{min(100, (downloaded / self.total_size) * 100):.1f}%"
+            self.progress_hook(progress)
+
+
+class _RemoteChanged(IOError):
+    """The remote file no longer matches the validators recorded for a resume."""
+
+
+class _ResumeState:
+    """Sidecar journal of the finished byte ranges of a .part file.
+
+    Ranges are half-open ``[start, end)`` pairs kept sorted and merged.
+    """
+
+    def __init__(self, path: str, url: str, etag: str, last_modified: str, total_size: int, ranges=None):
+        self.path = path
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.total_size = total_size
+        self.ranges = [list(r) for r in (ranges or [])]
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+
+    @classmethod
+    def load(cls, path: str, url: str, etag: str, last_modified: str, total_size: int) -> "_ResumeState":
+        """Return the saved state if it still describes the same remote file, else a fresh one."""
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            if (data.get("url") == url and data.get("etag") == etag
+                    and data.get("last_modified") == last_modified
+                    and data.get("total_size") == total_size):
+                return cls(path, url, etag, last_modified, total_size, data.get("ranges"))
+        except (OSError, ValueError):
+            pass
+        return cls(path, url, etag, last_modified, total_size)
+
+    def mark(self, start: int, end: int):
+        """Record [start, end) as written and periodically flush the journal."""
+        with self._lock:
+            merged = []
+            for r in self.ranges:
+                if r[1] < start or r[0] > end:
+                    merged.append(r)
+                else:
+                    start, end = min(start, r[0]), max(end, r[1])
+            merged.append([start, end])
+            merged.sort()
+            self.ranges = merged
+            due = time.time() - self._last_save >= STATE_SAVE_INTERVAL
+        if due:
+            self.save()
+
+    def done_bytes(self) -> int:
+        with self._lock:
+            return sum(end - start for start, end in self.ranges)
+
+    def missing(self) -> list:
+        """Return the half-open byte ranges that still need fetching."""
+        with self._lock:
+            gaps, pos = [], 0
+            for start, end in self.ranges:
+                if start > pos:
+                    gaps.append((pos, start))
+                pos = max(pos, end)
+            if pos < self.total_size:
+                gaps.append((pos, self.total_size))
+            return gaps
+
+    def save(self):
+        """Atomically write the journal next to the .part file."""
+        with self._lock:
+            data = {
+                "url": self.url,
+                "etag": self.etag,
+                "last_modified": self.last_modified,
+                "total_size": self.total_size,
+                "ranges": [list(r) for r in self.ranges],
+            }
+            self._last_save = time.time()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def discard(self):
+        """Forget all progress and delete the journal."""
+        with self._lock:
+            self.ranges = []
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _preallocate(fd: int, size: int, path: str):
+    """Reserve `size` bytes for fd so a full disk fails now rather than mid-download."""
+    current = os.fstat(fd).st_size
+    if current >= size:
+        return
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                raise
+            # Filesystem can't fallocate - fall back to a sparse file
+    if size - current > shutil.disk_usage(os.path.dirname(path) or ".").free:
+        raise OSError(errno.ENOSPC, "Not enough disk space for download", path)
+    os.ftruncate(fd, size)
+
+
+class PartFile:
+    """Preallocated .part file that many threads write into at explicit offsets."""
+
+    def __init__(self, path: str, size: int = 0, hasher: OrderedHasher = None):
+        self.path = path
+        self.hasher = hasher
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        self._lock = threading.Lock()
+        try:
+            if size:
+                _preallocate(self._fd, size, path)
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    def write_at(self, offset: int, data: bytes):
+        """Write data at offset without disturbing other writers."""
+        view, pos = memoryview(data), offset
+        if hasattr(os, "pwrite"):
+            while view:
+                n = os.pwrite(self._fd, view, pos)
+                view, pos = view[n:], pos + n
+        else:
+            with self._lock:
+                os.lseek(self._fd, pos, os.SEEK_SET)
+                while view:
+                    view = view[os.write(self._fd, view):]
+        if self.hasher:
+            self.hasher.update(offset, data)  # After the write: it may read this range back
+
+    def truncate(self, size: int):
+        os.ftruncate(self._fd, size)
+
+    def close(self):
+        os.close(self._fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def filename_for(url: str) -> str:
+    filename = os.path.basename(urlparse(url).path)
+    if not filename or "." not in filename:
+        filename = f"download_{hash(url) % 10000}"
+    return filename
+
+
+def claim_output(filepath: str) -> str:
+    """Reserve an output path for one in-flight download and return it (see release_output).
+
+    If another download holds filepath, the first free "name (1).ext", "name (2).ext", ...
+    is claimed instead, so two tasks that resolve to the same name never share a file.
+    """
+    root, ext = os.path.splitext(filepath)
+    with _claimed_lock:
+        claimed, n = filepath, 0
+        while claimed in _claimed_outputs:
+            n += 1
+            claimed = f"{root} ({n}){ext}"
+        _claimed_outputs.add(claimed)
+    return claimed
+
+
+def release_output(filepath: str):
+    with _claimed_lock:
+        _claimed_outputs.discard(filepath)
+
+
+def part_path_for(filepath: str, task_key=None) -> str:
+    """In-progress file for filepath; a task key (a queue task id) gives each task its own."""
+    return filepath + PART_SUFFIX if task_key is None else f"{filepath}.{task_key}{PART_SUFFIX}"
+
+
+def _probe(session: requests.Session, url: str) -> dict:
+    """HEAD the URL for its size, range support and cache validators."""
+    remote = {"total_size": 0, "accepts_ranges": False, "etag": None, "last_modified": None}
     try:
-        # Create session with connection pooling for faster downloads
-        session = requests.Session()
-        session.headers.update({
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-        })
-        
-        response = session.get(url, stream=True, timeout=30)
+        response = session.head(url, allow_redirects=True, timeout=30)
         response.raise_for_status()
+    except requests.RequestException:
+        return remote
+    remote["total_size"] = int(response.headers.get("content-length", 0))
+    remote["accepts_ranges"] = response.headers.get("accept-ranges", "").lower() == "bytes"
+    remote["etag"] = response.headers.get("etag")
+    remote["last_modified"] = response.headers.get("last-modified")
+    return remote
+
+
+def _probe_mirrors(session: requests.Session, url: str, mirrors: list = None) -> dict:
+    """Probe url plus any mirrors and keep the ones serving the same number of bytes.
+
+    The returned probe dict is the first mirror that answered, with a MirrorSet under "mirrors".
+    """
+    probes = {}
+    for candidate in [url] + [m for m in (mirrors or []) if m and m != url]:
+        started = time.monotonic()
+        probes[candidate] = _probe(session, candidate)
+        probes[candidate]["ttfb"] = time.monotonic() - started
+    primary = next((probes[u] for u in probes if probes[u]["total_size"]), probes[url])
+    if primary["total_size"]:
+        # Ranged downloads need ranged mirrors; a single stream can restart on any same-size one
+        ranged = primary["accepts_ranges"]
+        matching = {
+            u: p for u, p in probes.items()
+            if p is primary or (p["total_size"] == primary["total_size"] and (p["accepts_ranges"] or not ranged))
+        }
+    else:
+        matching = probes  # Sizes unknown: mirrors can only serve as whole-file fallbacks
+    mirror_set = MirrorSet(matching)
+    for u, p in matching.items():
+        mirror_set.record_ttfb(u, p["ttfb"])
+    remote = dict(primary)
+    remote["accepts_ranges"] = bool(primary["total_size"]) and all(p["accepts_ranges"] for p in matching.values())
+    remote["mirrors"] = mirror_set
+    return remote
 
-        filename = os.path.basename(urlparse(url).path)
-        if not filename or "." not in filename:
-            filename = f"download_{hash(url) % 10000}"
 
-        filepath = os.path.join(download_path, filename)
+def _if_range_validator(remote: dict):
+    """Pick a validator usable in If-Range (weak ETags are not allowed there)."""
+    etag = remote.get("etag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return remote.get("last_modified")
+
+
+def _plan_segments(missing: list, segments: int) -> list:
+    """Split the missing half-open ranges into roughly `segments` pieces."""
+    remaining = sum(end - start for start, end in missing)
+    if not remaining:
+        return []
+    target = max(MIN_SEGMENT_SIZE, -(-remaining // max(1, segments)))
+    plan = []
+    for start, end in missing:
+        while start < end:
+            stop = end if end - start < target + MIN_SEGMENT_SIZE else start + target
+            plan.append((start, stop))
+            start = stop
+    return plan
+
+
+class ChunkSizer:
+    """Pick chunk sizes from the throughput and time-to-first-byte measured on a connection.
+
+    A chunk aims to cover max(CHUNK_TARGET_SECONDS, 2 * TTFB) worth of data, so small or slow
+    transfers hand over small buffers and fast, high-latency ones grow toward the cap.
+    """
+
+    def __init__(self, ttfb: float = 0.0):
+        self.ttfb = ttfb
+        self.rate = None
+
+    def observe(self, nbytes: int, seconds: float):
+        sample = nbytes / max(seconds, 1e-6)
+        self.rate = sample if self.rate is None else 0.5 * sample + 0.5 * self.rate
+
+    def next_size(self, cap: int = CHUNK_SIZE) -> int:
+        if self.rate is None:
+            return min(MIN_CHUNK_SIZE, cap)
+        size = int(self.rate * max(CHUNK_TARGET_SECONDS, 2 * self.ttfb))
+        return max(MIN_CHUNK_SIZE, min(size, cap))
+
+
+def _read_chunks(response: requests.Response, sizer: ChunkSizer, tracker: ProgressTracker, remaining: int = None):
+    """Yield (chunk, read_seconds) pairs sized by the sizer's latest estimate.
+
+    Socket reads stay at MIN_CHUNK_SIZE and are gathered into a chunk until it reaches the
+    target size or MAX_CHUNK_SECONDS pass, so a mirror that slows down is noticed quickly.
+    Reads go through iter_content so a reset or stalled body raises a requests exception
+    (not urllib3's ProtocolError/ReadTimeoutError), which the mirror failover catches.
+    """
+    buf = bytearray()
+    target = sizer.next_size(tracker.chunk_size)
+    started = time.monotonic()
+    for piece in response.iter_content(MIN_CHUNK_SIZE):
+        if tracker.stopped:
+            return
+        buf += piece
+        elapsed = time.monotonic() - started
+        if remaining is not None and len(buf) >= remaining:
+            break
+        if len(buf) >= target or elapsed >= MAX_CHUNK_SECONDS:
+            sizer.observe(len(buf), elapsed)
+            if remaining is not None:
+                remaining -= len(buf)
+            yield bytes(buf), elapsed
+            buf = bytearray()
+            target = sizer.next_size(tracker.chunk_size)
+            started = time.monotonic()
+    if buf:
+        elapsed = time.monotonic() - started
+        sizer.observe(len(buf), elapsed)
+        yield bytes(buf[:remaining] if remaining is not None else buf), elapsed
+
+
+class _MirrorFailed(IOError):
+    """A mirror errored, stalled or fell below the throughput floor mid-range."""
+
+    def __init__(self, url: str, start: int, end: int, reason: str):
+        super().__init__(f"{url}: {reason}")
+        self.url = url
+        self.start = start
+        self.end = end
+
+
+def _fetch_range(session: requests.Session, url: str, start: int, end: int, part: PartFile,
+                 state: _ResumeState, mirrors: MirrorSet, tracker: ProgressTracker):
+    """Fetch [start, end) from one mirror and write it at its offset in the .part file."""
+    headers = {"Range": f"bytes={start}-{end - 1}"}
+    validator = _if_range_validator(mirrors.remotes[url])
+    if validator:
+        headers["If-Range"] = validator
+    pos = start
+    try:
+        requested = time.monotonic()
+        with session.get(url, headers=headers, stream=True, timeout=(30, mirrors.read_timeout(url, 30))) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise _RemoteChanged(f"Server did not honour range {start}-{end - 1}")
+            ttfb = time.monotonic() - requested
+            mirrors.record_ttfb(url, ttfb)
+            get_metrics().ttfb.observe(ttfb)
+            sizer = ChunkSizer(ttfb)
+            read_time = 0.0
+            for chunk, elapsed in _read_chunks(response, sizer, tracker, end - pos):
+                if tracker.stopped:
+                    break
+                part.write_at(pos, chunk)
+                state.mark(pos, pos + len(chunk))
+                pos += len(chunk)
+                tracker.add(len(chunk))
+                read_time += elapsed
+                rate = (pos - start) / max(read_time, 1e-6)
+                mirrors.record_throughput(url, sizer.rate)
+                if mirrors.is_slow(url, rate, read_time):
+                    raise _MirrorFailed(url, pos, end, f"below {MIN_THROUGHPUT} B/s")
+                if mirrors.is_failed(url):
+                    raise _MirrorFailed(url, pos, end, "mirror abandoned")
+    except (requests.RequestException, _RemoteChanged) as e:
+        if mirrors.has_alternative(url):
+            raise _MirrorFailed(url, pos, end, str(e)) from e
+        raise
+    # A stopped read loop is not a mirror fault: cancel ends the task, a sibling's failure ends this range
+    if tracker.cancelled:
+        raise DownloadCancelled()
+    if tracker.stopped:
+        return
+    if pos < end:
+        raise _MirrorFailed(url, pos, end, "connection closed early")
+
+
+def _download_ranges(session: requests.Session, url: str, part_path: str, remote: dict,
+                     segments: int, progress_hook=None, hasher: OrderedHasher = None,
+                     cancel_event: threading.Event = None, task_key=None):
+    """Fetch whatever the resume journal says is missing, `segments` ranges at a time.
+
+    Initial ranges are spread round-robin over healthy mirrors; a range whose mirror fails
+    or drops below the throughput floor continues from where it stopped on the fastest other one.
+    """
+    state = _ResumeState.load(part_path[:-len(PART_SUFFIX)] + STATE_SUFFIX, url, remote["etag"],
+                              remote["last_modified"], remote["total_size"])
+    if not os.path.exists(part_path):
+        state.discard()
+
+    mirrors = remote.get("mirrors") or MirrorSet({url: remote})
+    plan = _plan_segments(state.missing(), segments)
+    tracker = ProgressTracker(url, remote["total_size"], progress_hook, state.done_bytes(),
+                              cancel_event=cancel_event, task_key=task_key)
+    try:
+        with PartFile(part_path, remote["total_size"], hasher) as part, \
+                ThreadPoolExecutor(max_workers=max(1, min(segments, len(plan)))) as pool:
+            pending = {
+                pool.submit(_fetch_range, session, mirrors.next_url(), start, end, part, state, mirrors, tracker)
+                for start, end in plan
+            }
+            try:
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        try:
+                            future.result()
+                        except _MirrorFailed as e:
+                            mirrors.mark_failed(e.url)
+                            fallback = mirrors.best(exclude=e.url)
+                            if fallback is None:
+                                raise
+                            pending.add(pool.submit(_fetch_range, session, fallback, e.start, e.end,
+                                                    part, state, mirrors, tracker))
+            except BaseException:
+                tracker.stop_event.set()
+                raise
+    except _RemoteChanged:
+        state.discard()
+        os.remove(part_path)
+        raise
+    except BaseException:
+        state.save()
+        raise
+
+    if state.missing():
+        state.save()
+        if tracker.cancelled:
+            raise DownloadCancelled()
+        raise IOError("Download incomplete")
+    state.discard()
+
+
+def _download_single(session: requests.Session, url: str, part_path: str, progress_hook=None,
+                     hasher: OrderedHasher = None, mirrors: MirrorSet = None, cancel_event: threading.Event = None,
+                     task_key=None):
+    """Fetch the whole file over one streamed connection (no resume possible).
+
+    With mirrors, a failed or stalled attempt restarts from byte 0 on the next one.
+    """
+    candidates = mirrors.healthy() if mirrors else [url]
+    for i, candidate in enumerate(candidates):
+        try:
+            _stream_whole(session, candidate, part_path, progress_hook, hasher,
+                          mirrors.read_timeout(candidate, 30) if mirrors else 30, cancel_event, mirrors, task_key)
+            return
+        except (requests.RequestException, _MirrorFailed):
+            if i == len(candidates) - 1:
+                raise
+            mirrors.mark_failed(candidate)
+            if hasher:
+                hasher.reset()
+
+
+def _stream_whole(session: requests.Session, url: str, part_path: str, progress_hook, hasher: OrderedHasher,
+                  read_timeout: float, cancel_event: threading.Event = None, mirrors: MirrorSet = None,
+                  task_key=None):
+    """Stream url into the .part file; with mirrors, give up on it below the throughput floor."""
+    requested = time.monotonic()
+    with session.get(url, stream=True, timeout=(30, read_timeout)) as response:
+        response.raise_for_status()
+        ttfb = time.monotonic() - requested
+        get_metrics().ttfb.observe(ttfb)
         total_size = int(response.headers.get("content-length", 0))
-        
-        # Use larger chunks for faster transfer
-        downloaded = 0
-        chunk_size = 4194304  # 4MB chunks for optimal speed
-        start_time = os.times()[4] if hasattr(os, 'times') else 0
-        
-        with open(filepath, "wb") as f:
-            for chunk in response.iter_content(chunk_size=chunk_size):
-                if chunk:
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    if progress_hook and total_size:
-                        pct = min(100, (downloaded / total_size) * 100)
-                        elapsed = (os.times()[4] if hasattr(os, 'times') else 0) - start_time
-                        speed_mbps = (downloaded / (1024 * 1024)) / max(elapsed, 0.1)
-                        progress_hook({
-                            "status": "downloading",
-                            "_percent_str": f"{pct:.1f}%",
-                            "_speed_str": f"{speed_mbps:.2f} MB/s"
-                        })
+        # Content-Length counts encoded bytes; only trust it for identity responses
+        encoded = response.headers.get("content-encoding", "identity") != "identity"
+        tracker = ProgressTracker(url, total_size, progress_hook, cancel_event=cancel_event, task_key=task_key)
+        sizer = ChunkSizer(ttfb)
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        with PartFile(part_path, 0 if encoded else total_size, hasher) as part:
+            pos = 0
+            read_time = 0.0
+            for chunk, elapsed in _read_chunks(response, sizer, tracker):
+                part.write_at(pos, chunk)
+                pos += len(chunk)
+                tracker.add(len(chunk))
+                if mirrors is not None:
+                    read_time += elapsed
+                    mirrors.record_throughput(url, sizer.rate)
+                    if mirrors.is_slow(url, pos / max(read_time, 1e-6), read_time):
+                        raise _MirrorFailed(url, 0, total_size, f"below {MIN_THROUGHPUT} B/s")
+            if tracker.cancelled:
+                raise DownloadCancelled()
+            part.truncate(pos)
+
+
+def _fetch_to_part(session: requests.Session, url: str, part_path: str, remote: dict, segments: int,
+                   rate_limit: float, progress_hook=None, hasher: OrderedHasher = None,
+                   cancel_event: threading.Event = None, task_key=None):
+    task_key = url if task_key is None else task_key
+    with get_governor().task_scope(task_key, rate_limit):
+        if remote["accepts_ranges"] and remote["total_size"]:
+            _download_ranges(session, url, part_path, remote, segments, progress_hook, hasher, cancel_event,
+                             task_key)
+        else:
+            _download_single(session, url, part_path, progress_hook, hasher, remote.get("mirrors"), cancel_event,
+                             task_key)
+
+
+def _fetch_and_hash(session: requests.Session, url: str, part_path: str, remote: dict, segments: int,
+                    rate_limit: float, progress_hook, algorithms: tuple, sha256: str = None,
+                    cancel_event: threading.Event = None, task_key=None) -> dict:
+    """Fetch into the .part file, hashing inline, and check it against an expected SHA-256."""
+    hasher = OrderedHasher(part_path, algorithms)
+    _fetch_to_part(session, url, part_path, remote, segments, rate_limit, progress_hook, hasher, cancel_event,
+                   task_key)
+    digests = hasher.hexdigests()
+    try:
+        verify(digests, sha256, part_path)
+    except IntegrityError:
+        os.remove(part_path)
+        raise
+    return digests
+
+
+def _download_deduped(store: ContentStore, session: requests.Session, url: str, filepath: str, part_path: str,
+                      remote: dict, segments: int, rate_limit: float, progress_hook, algorithms: tuple,
+                      sha256: str = None, cancel_event: threading.Event = None, task_key=None) -> dict:
+    """Link an already-stored copy if the remote identity is known, else fetch, hash and store."""
+    keys = ContentStore.remote_keys(url, remote["etag"], remote["last_modified"], remote["total_size"])
+    digest = store.lookup(keys)
+    if digest is not None:
+        digests = {"sha256": digest}
+        verify(digests, sha256, filepath)
+    else:
+        digests = _fetch_and_hash(session, url, part_path, remote, segments, rate_limit, progress_hook,
+                                  algorithms, sha256, cancel_event, task_key)
+        store.ingest(part_path, digests["sha256"])
+        store.remember(keys, digests["sha256"])
+    store.materialize(digests["sha256"], filepath)
+    return digests
+
+
+def _finalize_output(url: str, download_path: str, filepath: str, algorithms: tuple, started: float,
+                     store: ContentStore = None):
+    """Checksum a finished streaming output, optionally move it into the store, and log it.
+
+    yt-dlp writes (and FFmpeg rewrites) these files itself, so this is the one read they need.
+    """
+    if not os.path.isfile(filepath):
+        return
+    digests = file_digests(filepath, algorithms)
+    if store:
+        store.ingest(filepath, digests["sha256"])
+        store.materialize(digests["sha256"], filepath)
+    if WRITE_MANIFEST:
+        record(download_path, url, filepath, digests, started)
+
+
+def download_direct(url: str, download_path: str, progress_hook=None, segments: int = DEFAULT_SEGMENTS,
+                    rate_limit: float = 0, dedupe: bool = False, sha256: str = None,
+                    fast_hash: bool = False, mirrors: list = None, cancel_event: threading.Event = None,
+                    task_key=None) -> bool:
+    """Download direct file (images, PDFs, etc.) via HTTP.
 
+    Data is written to ``<name>.part`` (``<name>.<task_key>.part`` with a task key) and
+    renamed into place once complete. When the server supports byte ranges, finished ranges
+    are journaled next to it in ``.part.json`` so a retry only fetches what is missing,
+    using up to `segments` concurrent ranges. While another download writes the same name,
+    this one is saved as ``<name> (1)`` and so on (see claim_output).
+    `rate_limit` (bytes/second) caps this task on top of the global bandwidth governor.
+
+    SHA-256 (plus a fast non-cryptographic hash with `fast_hash`) is computed as the
+    bytes stream and logged to the directory's manifest. If `sha256` is given and does
+    not match, the download fails. With `dedupe`, content is kept once in the download
+    path's content store and linked under the requested name. A known `sha256`, or a size
+    and ETag seen before, is then served from the store without touching the network.
+
+    `mirrors` lists other URLs for the same bytes. Ranges are spread across the mirrors
+    that match in size, and work moves off any mirror that errors, stalls or drops below
+    the throughput floor. Read sizes adapt to each connection's throughput and TTFB.
+
+    With the archive on (set_use_archive), a URL already in the download path's archive is
+    skipped if its file still exists and, when an ETag was recorded, a HEAD request shows
+    the same ETag.
+    Setting `cancel_event` aborts the transfer (raising DownloadCancelled) and keeps the
+    .part file for a later resume. `task_key` names the task to the bandwidth governor and
+    metrics (default: the URL).
+    """
+    transport = get_transport()
+    session = transport.session
+    segments = max(1, min(segments, transport.host_limit(url)))
+    sha256 = sha256.strip().lower() if sha256 else None
+    algorithms = CHECKSUM_ALGORITHMS + ((FAST_HASH,) if fast_hash else ())
+    started = time.time()
+    filepath = None
+    try:
+        archive = open_archive(download_path)
+        archived = archive.lookup(direct_key(url)) if archive else None
+        if archived is not None and (archived[0] is None or archived[0] == _probe(session, url)["etag"]):
+            if progress_hook:
+                progress_hook({"status": "finished", "archived": True})
+            return True
+
+        filepath = claim_output(os.path.join(download_path, filename_for(url)))
+        part_path = part_path_for(filepath, task_key)
+        store = get_content_store(download_path) if dedupe else None
+        remote = {}
+
+        if store and store.has(sha256):
+            store.materialize(sha256, filepath)
+            digests = {"sha256": sha256}
+        elif store:
+            remote = _probe_mirrors(session, url, mirrors)
+            digests = _download_deduped(store, session, url, filepath, part_path, remote, segments, rate_limit,
+                                        progress_hook, algorithms, sha256, cancel_event, task_key)
+        else:
+            remote = _probe_mirrors(session, url, mirrors)
+            digests = _fetch_and_hash(session, url, part_path, remote, segments, rate_limit, progress_hook,
+                                      algorithms, sha256, cancel_event, task_key)
+            os.replace(part_path, filepath)
+
+        if WRITE_MANIFEST:
+            record(download_path, url, filepath, digests, started)
+        if archive:
+            archive.add(direct_key(url), path=filepath, etag=remote.get("etag"))
         if progress_hook:
             progress_hook({"status": "finished"})
-        session.close()
         return True
+    except DownloadCancelled:
+        raise
     except Exception as e:
         if progress_hook:
-            progress_hook({"status": "error", "error": str(e)})
+            progress_hook({"status": "error", "error": str(e), "exception": e})
         return False
+    finally:
+        if filepath is not None:
+            release_output(filepath)
+
 
+def download(url: str, download_path: str, quality: str = "Best", media_format: str = "MP4", progress_hook=None,
+             cancel_event: threading.Event = None, backend: str = None, task_key=None, **options) -> bool:
+    """Unified download entry point - auto-detects source type.
 
-def download(url: str, download_path: str, quality: str = "Best", media_format: str = "Video", progress_hook=None) -> bool:
-    """Unified download entry point - auto-detects source type."""
-    if is_streaming_url(url):
-        return download_streaming(url, download_path, quality, media_format, progress_hook)
-    return download_direct(url, download_path, progress_hook)
+    Extra keyword options (e.g. ``segments``, ``rate_limit``) are passed to the direct
+    downloader; those named in STREAMING_OPTIONS also apply to streaming downloads.
+    URLs routed to a plugin backend (router.register_backend) go to its handler.
+    `backend` is the URL's route when the caller already classified it (Router.classify).
+    Setting `cancel_event` aborts a direct or streaming download with DownloadCancelled.
+    `task_key` (e.g. a queue task id) names the download to the bandwidth governor and metrics,
+    so two tasks for the same URL keep separate limits and byte counts.
+    """
+    backend = backend or get_router().route(url)
+    if backend == STREAMING:
+        streaming_options = {k: v for k, v in options.items() if k in STREAMING_OPTIONS}
+        return download_streaming(url, download_path, quality, media_format, progress_hook,
+                                  cancel_event=cancel_event, task_key=task_key, **streaming_options)
+    if backend != DIRECT and get_router().handler(backend):
+        return get_router().handler(backend)(url, download_path, quality, media_format, progress_hook, **options)
+    return download_direct(url, download_path, progress_hook, cancel_event=cancel_event, task_key=task_key,
+                           **options)
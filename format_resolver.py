@@ -0,0 +1,176 @@
+"""
+Format Resolver
+Picks concrete yt-dlp format IDs from an extracted format list, so the
+requested container, codec and height are matched locally instead of through
+selector strings, and decides up front whether a remux or transcode is needed.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+# Codec-family formats in the UI and the codec strings extractors report for them
+CODEC_FAMILIES = {
+    "HEVC": ("hevc", "hvc1", "hev1", "h265"),
+    "H264": ("avc1", "h264"),
+    "VP8": ("vp8",),
+    "VP9": ("vp9", "vp09"),
+    "AV1": ("av01",),
+}
+
+# Codecs each container can hold without re-encoding; unlisted containers accept anything
+CONTAINER_CODECS = {
+    "mp4": (("avc1", "h264", "hevc", "hvc1", "hev1", "av01", "vp09"), ("mp4a", "aac", "mp3")),
+    "m4v": (("avc1", "h264", "hevc", "hvc1", "hev1"), ("mp4a", "aac")),
+    "mov": (("avc1", "h264", "hevc", "hvc1", "hev1"), ("mp4a", "aac", "mp3")),
+    "webm": (("vp8", "vp9", "vp09", "av01"), ("opus", "vorbis")),
+}
+
+# Audio targets and the stream codecs that can be kept as-is for them
+AUDIO_CODECS = {
+    "mp3": ("mp3",), "m4a": ("mp4a", "aac"), "aac": ("mp4a", "aac"),
+    "opus": ("opus",), "ogg": ("vorbis",), "flac": ("flac",), "wav": ("pcm",),
+}
+
+MEMO_SIZE = 256  # (extractor, profile, format ladder) choices remembered
+
+
+class Resolution:
+    """Chosen format IDs plus the post-processing they imply."""
+
+    __slots__ = ("format_ids", "remux", "transcode")
+
+    def __init__(self, format_ids: tuple, remux: bool = False, transcode: bool = False):
+        self.format_ids = format_ids
+        self.remux = remux  # Single stream in a different container than requested
+        self.transcode = transcode  # Audio codec differs from the requested one
+
+    @property
+    def selector(self) -> str:
+        return "+".join(self.format_ids)
+
+
+def _codec(value) -> str:
+    return (value or "").lower()
+
+
+def _matches(codec: str, prefixes) -> bool:
+    return any(codec.startswith(p) for p in prefixes)
+
+
+def _usable(f: dict) -> bool:
+    return f.get("format_id") and f.get("ext") != "mhtml" and not f.get("has_drm")
+
+
+def _ladder(formats: list) -> frozenset:
+    """Everything scoring looks at except bitrate, which only breaks ties between equal formats."""
+    return frozenset((f["format_id"], f.get("ext"), _codec(f.get("vcodec")), _codec(f.get("acodec")),
+                      f.get("height") or 0, f.get("fps") or 0) for f in formats)
+
+
+class FormatResolver:
+    """Resolves (formats, profile) to a Resolution, memoized per (extractor, profile, format ladder).
+
+    A memoized choice is reused for the next item from the same extractor that offers the
+    same formats at the same heights, frame rates and codecs (e.g. a playlist of uploads
+    with the same YouTube itags), skipping the scoring pass. An item with a different
+    ladder, such as one that also offers 2160p, is scored afresh.
+    """
+
+    def __init__(self, memo_size: int = MEMO_SIZE):
+        self.memo_size = memo_size
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, info: dict, container: str, max_height: int = None, vcodecs: tuple = (),
+                audio_only: bool = False):
+        """Return a Resolution for info's formats, or None to leave selection to yt-dlp."""
+        formats = [f for f in info.get("formats") or () if _usable(f)]
+        if not formats:
+            return None
+        profile = (container, max_height, vcodecs, audio_only)
+        key = ((info.get("extractor_key") or info.get("extractor") or "").lower(), profile, _ladder(formats))
+        with self._lock:
+            cached = self._memo.get(key)
+            if cached:
+                self._memo.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        if audio_only:
+            resolution = self._resolve_audio(formats, container)
+        else:
+            resolution = self._resolve_video(formats, container, max_height, vcodecs)
+        if resolution is not None:
+            with self._lock:
+                self._memo[key] = resolution
+                self._memo.move_to_end(key)
+                while len(self._memo) > self.memo_size:
+                    self._memo.popitem(last=False)
+        return resolution
+
+    @staticmethod
+    def _resolve_audio(formats: list, target: str):
+        keep = AUDIO_CODECS.get(target, (target,))
+        audio = [f for f in formats if _codec(f.get("vcodec")) == "none" and _codec(f.get("acodec")) != "none"]
+        if not audio:
+            return None
+        best = max(audio, key=lambda f: (
+            _matches(_codec(f.get("acodec")), keep),
+            f.get("ext") == target,
+            f.get("abr") or f.get("tbr") or 0,
+        ))
+        as_is = _matches(_codec(best.get("acodec")), keep) and best.get("ext") == target
+        return Resolution((best["format_id"],), transcode=not as_is)
+
+    @staticmethod
+    def _resolve_video(formats: list, container: str, max_height: int, vcodecs: tuple):
+        video_ok, audio_ok = CONTAINER_CODECS.get(container, ((), ()))
+        videos = [f for f in formats if _codec(f.get("vcodec")) != "none"]
+        if max_height:
+            fitting = [f for f in videos if (f.get("height") or 0) <= max_height]
+            videos = fitting or sorted(videos, key=lambda f: f.get("height") or 0)[:1]
+        if not videos:
+            return None
+
+        def video_key(f):
+            vcodec = _codec(f.get("vcodec"))
+            return (
+                not vcodecs or _matches(vcodec, vcodecs),
+                not video_ok or _matches(vcodec, video_ok),
+                f.get("height") or 0,
+                f.get("fps") or 0,
+                f.get("tbr") or f.get("vbr") or 0,
+            )
+
+        best_video = max(videos, key=video_key)
+        progressive = [f for f in videos if _codec(f.get("acodec")) != "none"]
+        best_progressive = max(progressive, key=video_key) if progressive else None
+        audio = [f for f in formats if _codec(f.get("vcodec")) == "none" and _codec(f.get("acodec")) != "none"]
+
+        if _codec(best_video.get("acodec")) == "none" and audio and (
+                best_progressive is None or video_key(best_video) > video_key(best_progressive)):
+            best_audio = max(audio, key=lambda f: (
+                not audio_ok or _matches(_codec(f.get("acodec")), audio_ok),
+                f.get("abr") or f.get("tbr") or 0,
+            ))
+            return Resolution((best_video["format_id"], best_audio["format_id"]))
+        chosen = best_progressive or best_video
+        return Resolution((chosen["format_id"],), remux=chosen.get("ext") != container)
+
+
+# Global resolver instance
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_format_resolver() -> FormatResolver:
+    """Get or create the global format resolver."""
+    global _resolver
+    with _resolver_lock:
+        if _resolver is None:
+            _resolver = FormatResolver()
+        return _resolver
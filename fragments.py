@@ -0,0 +1,157 @@
+"""
+Fragment Concurrency Budget
+One pool of fragment workers shared by every streaming task. Each task's share
+of the budget and its HTTP chunk size are tuned AIMD-style from the fragment
+latency and throughput seen in yt-dlp progress reports.
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+
+FRAGMENT_BUDGET = 32  # Fragment workers across all streaming tasks
+START_WORKERS = 4  # Workers a task starts with on a host we know nothing about
+LATENCY_BACKOFF = 2.0  # Fragment latency above baseline * this counts as congestion
+BASELINE_WEIGHT = 0.1  # How fast the latency baseline follows slower samples
+HTTP_CHUNK_SECONDS = 4.0  # Size http_chunk_size so one chunk takes about this long
+MIN_HTTP_CHUNK = 1048576  # 1MB
+MAX_HTTP_CHUNK = 10485760  # 10MB; larger ranges get throttled by some CDNs
+DEFAULT_HTTP_CHUNK = 2097152  # 2MB until we have a throughput sample
+
+
+class FragmentController:
+    """AIMD state for one streaming task.
+
+    A round is `workers` completed fragments. Additive increase: one more worker
+    after a round whose fragment latency stayed near the baseline. Multiplicative
+    decrease: halve the workers after a round whose latency jumped past
+    LATENCY_BACKOFF times the baseline.
+    """
+
+    def __init__(self, budget: "FragmentBudget", host: str, workers: int, chunk_size: int):
+        self.budget = budget
+        self.host = host
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.baseline = None  # Fragment latency when the server is not pushing back
+        self.params = None
+        self._high = None  # Highest fragment index reported so far
+        self._round_start = None
+        self._round = 0  # Fragments completed in the current round
+        self._lock = threading.Lock()
+
+    def attach(self, params: dict):
+        """Write the current settings into a YoutubeDL params dict and keep updating it.
+
+        yt-dlp reads these when each format download starts, so changes apply from the
+        next format (e.g. the audio stream after the video) or the next playlist entry.
+        """
+        self.params = params
+        self.apply()
+
+    def apply(self):
+        if self.params is not None:
+            self.params["concurrent_fragment_downloads"] = self.budget.allowance(self)
+            self.params["http_chunk_size"] = self.chunk_size
+
+    def observe(self, d: dict):
+        """Progress hook: feed fragment completions and throughput into the controller."""
+        status = d.get("status")
+        if status == "finished":
+            with self._lock:
+                self._high = self._round_start = None
+            return
+        if status != "downloading":
+            return
+        now = time.monotonic()
+        index = d.get("fragment_index")
+        with self._lock:
+            speed = d.get("speed")
+            if speed:
+                self.chunk_size = int(max(MIN_HTTP_CHUNK, min(MAX_HTTP_CHUNK, speed * HTTP_CHUNK_SECONDS)))
+            if index is None:
+                return
+            if self._high is None:
+                self._high, self._round_start, self._round = index, now, 0
+                return
+            # Concurrent fragment threads report out of order; only count new highs
+            if index <= self._high:
+                return
+            self._round += index - self._high
+            self._high = index
+            if self._round < self.workers:
+                return
+            # With N workers in flight, fragments complete N times faster than any one takes
+            latency = (now - self._round_start) / self._round * self.workers
+            self._round_start, self._round = now, 0
+            self._end_round(latency)
+        self.apply()
+
+    def _end_round(self, latency: float):
+        if self.baseline is None:
+            self.baseline = latency
+        elif latency > self.baseline * LATENCY_BACKOFF:
+            self.workers = max(1, self.workers // 2)
+            # Drift up so a server that is simply slower does not keep us at one worker
+            self.baseline += BASELINE_WEIGHT * (latency - self.baseline)
+        else:
+            self.baseline = min(latency, self.baseline + BASELINE_WEIGHT * (latency - self.baseline))
+            self.workers = min(self.workers + 1, self.budget.share())
+
+
+class FragmentBudget:
+    """Splits `total` fragment workers evenly across active streaming tasks."""
+
+    def __init__(self, total: int = FRAGMENT_BUDGET):
+        self.total = total
+        self._active = set()
+        self._learned = {}  # host -> (workers, chunk_size) from the last finished task
+        self._lock = threading.Lock()
+
+    def set_total(self, total: int):
+        """Change the process-wide budget; running tasks pick it up on their next format."""
+        with self._lock:
+            self.total = max(1, int(total))
+
+    def share(self) -> int:
+        with self._lock:
+            return max(1, self.total // max(1, len(self._active)))
+
+    def allowance(self, controller: FragmentController) -> int:
+        """Workers the controller may use right now: its own window, capped by its fair share."""
+        return max(1, min(controller.workers, self.share()))
+
+    @contextmanager
+    def task_scope(self, url: str):
+        """Register a streaming task and yield its controller, seeded from the host's last task."""
+        host = (urlparse(url).hostname or "").lower()
+        with self._lock:
+            workers, chunk_size = self._learned.get(host, (START_WORKERS, DEFAULT_HTTP_CHUNK))
+            controller = FragmentController(self, host, workers, chunk_size)
+            self._active.add(controller)
+        try:
+            yield controller
+        finally:
+            with self._lock:
+                self._active.discard(controller)
+                self._learned[host] = (controller.workers, controller.chunk_size)
+
+    def active_tasks(self) -> int:
+        with self._lock:
+            return len(self._active)
+
+
+# Global fragment budget instance
+_budget = None
+_budget_lock = threading.Lock()
+
+
+def get_fragment_budget() -> FragmentBudget:
+    """Get or create the global fragment budget."""
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = FragmentBudget()
+        return _budget
@@ -0,0 +1,150 @@
+"""
+Streaming Digests
+Hash a file in byte order while its chunks are being written, even when
+parallel segments deliver those chunks out of order.
+"""
+
+import zlib
+import hashlib
+import threading
+from bisect import bisect_right
+
+try:
+    import xxhash
+    HAS_XXHASH = True
+except ImportError:
+    HAS_XXHASH = False
+
+
+READ_SIZE = 1048576  # Block size for reading written ranges back to hash them
+FAST_HASH = "xxh3_64" if HAS_XXHASH else "crc32"  # Cheap non-cryptographic digest
+
+
+class _Crc32:
+    """hashlib-style wrapper around zlib.crc32."""
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data: bytes):
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self) -> str:
+        return f"{self.value:08x}"
+
+
+def new_hash(name: str):
+    """Create a hasher for a hashlib algorithm, an xxhash variant, or crc32."""
+    if name == "crc32":
+        return _Crc32()
+    if name.startswith("xxh"):
+        if not HAS_XXHASH:
+            raise ValueError(f"{name} requires the xxhash package")
+        return getattr(xxhash, name)()
+    return hashlib.new(name)
+
+
+class OrderedHasher:
+    """Feed chunks after they are written; digests are computed over the file in byte order.
+
+    A chunk landing exactly at the hashed prefix is hashed from memory. Chunks ahead of it
+    (other segments) are only noted; once the prefix reaches them, the thread that extended
+    it reads them back from the file while they are still in the page cache, so hashing
+    keeps up with the download instead of re-reading most of the file at the end. Only
+    bytes that never came through update() (kept from an earlier, resumed attempt) are
+    left for hexdigests() to read.
+    """
+
+    def __init__(self, path: str, algorithms=("sha256",)):
+        self.path = path
+        self._hashers = {name: new_hash(name) for name in algorithms}
+        self.position = 0
+        self._ahead = []  # Sorted, merged [start, end) ranges written past the prefix and not hashed yet
+        self._busy = False  # One thread hashes at a time; the others only note their ranges
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Start over, e.g. when a download restarts from byte 0."""
+        with self._lock:
+            self._hashers = {name: new_hash(name) for name in self._hashers}
+            self.position = 0
+            self._ahead = []
+
+    def _note(self, start: int, end: int):
+        """Record [start, end) as written but not hashed (caller holds the lock)."""
+        ahead = self._ahead
+        i = bisect_right(ahead, [start, end])
+        if i and ahead[i - 1][1] >= start:
+            i -= 1
+            ahead[i][1] = max(ahead[i][1], end)
+        else:
+            ahead.insert(i, [start, end])
+        while i + 1 < len(ahead) and ahead[i + 1][0] <= ahead[i][1]:
+            ahead[i][1] = max(ahead[i][1], ahead.pop(i + 1)[1])
+
+    def update(self, offset: int, data: bytes):
+        """Account for data just written at offset, hashing whatever is now contiguous with the prefix."""
+        end = offset + len(data)
+        with self._lock:
+            if self._busy or offset != self.position:
+                if end > self.position:
+                    self._note(max(offset, self.position), end)
+                return
+            self._busy = True
+        f = None
+        try:
+            while data:
+                for h in self._hashers.values():
+                    h.update(data)
+                with self._lock:
+                    self.position += len(data)
+                    ahead = self._ahead
+                    while ahead and ahead[0][1] <= self.position:
+                        ahead.pop(0)
+                    if not ahead or ahead[0][0] > self.position:
+                        self._busy = False  # In this critical section, so the next chunk at the prefix is hashed
+                        return
+                    # Claim the next block of the range that now touches the prefix
+                    start = self.position
+                    stop = min(ahead[0][1], start + READ_SIZE)
+                    if stop == ahead[0][1]:
+                        ahead.pop(0)
+                    else:
+                        ahead[0][0] = stop
+                if f is None:
+                    f = open(self.path, "rb")
+                f.seek(start)
+                data = f.read(stop - start)
+            with self._lock:
+                self._busy = False  # Short read: hexdigests() picks up the rest
+        except BaseException:
+            with self._lock:
+                self._busy = False
+            raise
+        finally:
+            if f is not None:
+                f.close()
+
+    def hexdigests(self, size: int = None) -> dict:
+        """Finish hashing (reading any bytes not yet hashed from disk) and return {algorithm: hexdigest}."""
+        with self._lock:
+            with open(self.path, "rb") as f:
+                f.seek(self.position)
+                while size is None or self.position < size:
+                    want = READ_SIZE if size is None else min(READ_SIZE, size - self.position)
+                    block = f.read(want)
+                    if not block:
+                        break
+                    for h in self._hashers.values():
+                        h.update(block)
+                    self.position += len(block)
+            self._ahead = []
+            return {name: h.hexdigest() for name, h in self._hashers.items()}
+
+    def hexdigest(self, algorithm: str = "sha256", size: int = None) -> str:
+        return self.hexdigests(size)[algorithm]
+
+
+def file_digests(path: str, algorithms=("sha256",)) -> dict:
+    """Hash a complete file that was written by someone else (e.g. yt-dlp)."""
+    return OrderedHasher(path, algorithms).hexdigests()
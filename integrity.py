@@ -0,0 +1,62 @@
+"""
+Integrity Manifest
+Per-directory JSON-lines record of every finished download: URL, path,
+size, digests and timings. Checksums are computed while the bytes stream.
+"""
+
+import os
+import json
+import time
+import threading
+
+
+MANIFEST_FILENAME = "manifest.jsonl"
+
+_lock = threading.Lock()
+
+
+class IntegrityError(IOError):
+    """A finished download does not match the checksum supplied with its task."""
+
+
+def verify(digests: dict, expected_sha256: str, path: str = None):
+    """Raise IntegrityError if an expected SHA-256 was given and does not match."""
+    if expected_sha256 and digests.get("sha256") != expected_sha256.strip().lower():
+        raise IntegrityError(
+            f"SHA-256 mismatch for {os.path.basename(path or '')}: "
+            f"expected {expected_sha256}, got {digests.get('sha256')}"
+        )
+
+
+def record(download_path: str, url: str, filepath: str, digests: dict, started: float, **extra):
+    """Append one entry to the download directory's manifest."""
+    finished = time.time()
+    entry = {
+        "url": url,
+        "path": os.path.relpath(filepath, download_path),
+        "size": os.path.getsize(filepath) if os.path.exists(filepath) else 0,
+        "digests": digests,
+        "started": round(started, 3),
+        "finished": round(finished, 3),
+        "elapsed": round(finished - started, 3),
+    }
+    entry.update(extra)
+    manifest_path = os.path.join(download_path, MANIFEST_FILENAME)
+    with _lock:
+        with open(manifest_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def read_manifest(download_path: str) -> list:
+    """Load every entry of a download directory's manifest."""
+    entries = []
+    try:
+        with open(os.path.join(download_path, MANIFEST_FILENAME), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return entries
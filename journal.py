@@ -0,0 +1,155 @@
+"""
+Queue Journal
+Write-ahead record of the download queue in SQLite (WAL mode): every enqueue,
+start, progress checkpoint, completion and failure is a row write, so the
+pending queue can be rebuilt after a crash or reboot with one indexed query.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from tasks import QUEUED, RUNNING, DONE
+
+
+JOURNAL_PATH = os.path.join(os.path.expanduser("~"), ".smile", "queue.sqlite3")
+CHECKPOINT_INTERVAL = 5.0  # Seconds between progress rows for one task
+HISTORY_KEEP = 10000  # Finished rows kept by compact()
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS tasks (
+        id INTEGER PRIMARY KEY,
+        url TEXT NOT NULL,
+        quality TEXT,
+        media_format TEXT,
+        options TEXT,
+        priority INTEGER,
+        size INTEGER,
+        state TEXT NOT NULL,
+        enqueued REAL,
+        updated REAL,
+        downloaded INTEGER DEFAULT 0,
+        title TEXT,
+        error TEXT
+    )
+    """,
+    # Restore only reads unfinished rows; keep them in a small partial index
+    "CREATE INDEX IF NOT EXISTS tasks_pending ON tasks(id) WHERE state IN ('queued', 'running')",
+    "CREATE INDEX IF NOT EXISTS tasks_finished ON tasks(updated) WHERE state NOT IN ('queued', 'running')",
+)
+
+
+class QueueJournal:
+    """Durable task table; queue_system writes to it, pending() reads it back."""
+
+    def __init__(self, path: str = JOURNAL_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._lock = threading.Lock()
+        self._checkpoints = {}  # task id -> time of its last progress row
+
+    def _execute(self, sql: str, args=()):
+        with self._lock:
+            self._conn.execute(sql, args)
+
+    def enqueue(self, task_id: int, url: str, quality: str, media_format: str, options: dict,
+                priority: int, size: int = None, enqueued: float = None):
+        self.enqueue_many([(task_id, url, quality, media_format, options, priority, size, enqueued)])
+
+    def enqueue_many(self, rows):
+        """Record (id, url, quality, media_format, options, priority, size, enqueued) rows in one transaction."""
+        now = time.time()
+        encoded = {}  # Bulk rows share one options dict; serialise it once
+
+        def encode(options):
+            key = id(options)
+            if key not in encoded:
+                encoded[key] = json.dumps(options or {}, default=str)
+            return encoded[key]
+
+        values = [(task_id, url, quality, media_format, encode(options), priority, size, QUEUED, enqueued or now, now)
+                  for task_id, url, quality, media_format, options, priority, size, enqueued in rows]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO tasks (id, url, quality, media_format, options, priority, size,"
+                " state, enqueued, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", values)
+            self._conn.execute("COMMIT")
+
+    def set_priority(self, task_id: int, priority: int):
+        self._execute("UPDATE tasks SET priority = ? WHERE id = ?", (priority, task_id))
+
+    def set_size(self, task_id: int, size: int):
+        self._execute("UPDATE tasks SET size = ? WHERE id = ?", (size, task_id))
+
+    def started(self, task_id: int):
+        self._execute("UPDATE tasks SET state = ?, updated = ? WHERE id = ?", (RUNNING, time.time(), task_id))
+
+    def progress(self, task_id: int, downloaded: int, title: str = None):
+        """Checkpoint bytes downloaded; writes at most once per CHECKPOINT_INTERVAL per task."""
+        now = time.time()
+        if now - self._checkpoints.get(task_id, 0.0) < CHECKPOINT_INTERVAL:
+            return
+        self._checkpoints[task_id] = now
+        self._execute("UPDATE tasks SET downloaded = ?, title = COALESCE(?, title), updated = ? WHERE id = ?",
+                      (downloaded, title, now, task_id))
+
+    def finished(self, task_id: int, state: str = DONE, title: str = None, error: str = None):
+        self._checkpoints.pop(task_id, None)
+        self._execute("UPDATE tasks SET state = ?, title = COALESCE(?, title), error = ?, updated = ? WHERE id = ?",
+                      (state, title, error, time.time(), task_id))
+
+    def retrying(self, task_id: int, error: str = None):
+        """Back to queued after a retryable failure; the error is kept until the next outcome."""
+        self._checkpoints.pop(task_id, None)
+        self._execute("UPDATE tasks SET state = ?, error = ?, updated = ? WHERE id = ?",
+                      (QUEUED, error, time.time(), task_id))
+
+    def remove(self, task_id: int):
+        self._execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+
+    def pending(self) -> list:
+        """(id, url, quality, media_format, options, priority, size, enqueued) of unfinished tasks, oldest first.
+
+        Tasks that were running when the process died come back as queued.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, url, quality, media_format, options, priority, size, enqueued FROM tasks"
+                " WHERE state IN ('queued', 'running') ORDER BY id").fetchall()
+        return [(task_id, url, quality, media_format, json.loads(options or "{}"), priority, size, enqueued)
+                for task_id, url, quality, media_format, options, priority, size, enqueued in rows]
+
+    def recent_finished(self, limit: int) -> list:
+        """(id, url, state, title, error) of the latest finished tasks, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, url, state, title, error FROM tasks WHERE state NOT IN ('queued', 'running')"
+                " ORDER BY updated DESC LIMIT ?", (limit,)).fetchall()
+        return rows[::-1]
+
+    def max_id(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(id), -1) FROM tasks").fetchone()[0]
+
+    def compact(self, keep: int = HISTORY_KEEP) -> int:
+        """Drop all but the newest `keep` finished rows and truncate the WAL; returns rows dropped."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM tasks WHERE state NOT IN ('queued', 'running') AND id NOT IN"
+                " (SELECT id FROM tasks WHERE state NOT IN ('queued', 'running') ORDER BY updated DESC LIMIT ?)",
+                (keep,))
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,9 +1,16 @@
 """
 Multimedia Download Manager
 A modern application for downloading videos, audio, images, and documents.
+With arguments it runs headless instead (see cli.py): `python main.py serve`.
 """
 
-from ui import launch_ui
+import sys
+import multiprocessing
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Transcode workers are spawned processes
+    if len(sys.argv) > 1:
+        from cli import main
+        sys.exit(main())
+    from ui import launch_ui  # Imported here so headless runs never load Tk
     launch_ui()
@@ -0,0 +1,197 @@
+"""
+Metadata Cache
+TTL-bounded cache of yt-dlp extraction results keyed by canonical URL or
+extractor:video-id, with an in-memory LRU and an optional on-disk store.
+"""
+
+import os
+import copy
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+
+DEFAULT_TTL = 1800  # Seconds; stream URLs inside info dicts expire after a few hours
+DEFAULT_MAX_ENTRIES = 512  # In-memory LRU size
+DEFAULT_MAX_DISK_BYTES = 256 * 1024 * 1024  # On-disk store budget
+
+_YOUTUBE_HOSTS = ("youtube.com", "m.youtube.com", "music.youtube.com")
+_TRACKING_PARAMS = {"si", "feature", "fbclid", "gclid"}
+
+
+def canonical_url(url: str) -> str:
+    """Normalise a URL so trivially different spellings share a cache entry."""
+    parsed = urlparse(url.strip())
+    host = parsed.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = [(k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+             if not k.startswith("utm_") and k not in _TRACKING_PARAMS]
+    if host in _YOUTUBE_HOSTS and parsed.path == "/watch":
+        video_id = dict(query).get("v")
+        if video_id:
+            return f"youtube:{video_id}"
+    if host == "youtu.be" and parsed.path.strip("/"):
+        return f"youtube:{parsed.path.strip('/')}"
+    path = parsed.path.rstrip("/") or "/"
+    return f"{parsed.scheme.lower()}://{host}{path}" + (f"?{urlencode(sorted(query))}" if query else "")
+
+
+def info_key(info: dict):
+    """extractor:id key for an extracted info dict, or None."""
+    extractor, video_id = info.get("extractor_key"), info.get("id")
+    if extractor and video_id:
+        return f"{extractor.lower()}:{video_id}"
+    return None
+
+
+class MetadataCache:
+    """LRU of info dicts with a TTL, optionally backed by JSON files in disk_dir."""
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 disk_dir: str = None, max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()  # key -> (stored_at, info)
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    @staticmethod
+    def _key(url: str, kind: str) -> str:
+        key = canonical_url(url)
+        return key if kind == "info" else f"{kind}|{key}"
+
+    def get(self, url: str, kind: str = "info"):
+        """Return a private copy of the cached result for url, or None if missing or expired.
+
+        `kind` separates different extraction modes, e.g. "flat" playlist listings.
+        """
+        return self.get_key(self._key(url, kind))
+
+    def get_by_id(self, extractor: str, video_id: str):
+        return self.get_key(f"{extractor.lower()}:{video_id}")
+
+    def get_key(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                return copy.deepcopy(entry[1])
+            self._entries.pop(key, None)
+        if self.disk_dir:
+            info = self._read_disk(key, now)
+            if info is not None:
+                self._remember(key, info, now)
+                return copy.deepcopy(info)
+        return None
+
+    def put(self, url: str, info: dict, kind: str = "info"):
+        """Cache info under the canonical URL (and, for full extractions, its extractor:id key)."""
+        if not info:
+            return
+        now = time.time()
+        keys = {self._key(url, kind)}
+        if kind == "info" and info_key(info):
+            keys.add(info_key(info))
+        info = copy.deepcopy(info)
+        for key in keys:
+            self._remember(key, info, now)
+            if self.disk_dir:
+                self._write_disk(key, info, now)
+
+    def _remember(self, key: str, info: dict, stored_at: float):
+        with self._lock:
+            self._entries[key] = (stored_at, info)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _read_disk(self, key: str, now: float):
+        path = self._disk_path(key)
+        try:
+            if now - os.path.getmtime(path) >= self.ttl:
+                os.remove(path)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key: str, info: dict, now: float):
+        path = self._disk_path(key)
+        try:
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(info, f)
+            os.replace(tmp, path)
+            os.utime(path, (now, now))
+            self._evict_disk()
+        except (OSError, TypeError, ValueError):
+            pass
+
+    def _evict_disk(self):
+        """Drop expired files, then the oldest ones until the store fits its byte budget."""
+        now = time.time()
+        files = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if now - st.st_mtime >= self.ttl:
+                os.remove(path)
+            else:
+                files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def invalidate(self, url: str, kind: str = "info"):
+        key = self._key(url, kind)
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.disk_dir and os.path.exists(self._disk_path(key)):
+            os.remove(self._disk_path(key))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Global metadata cache instance
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_metadata_cache() -> MetadataCache:
+    """Get or create the global (memory-only by default) metadata cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MetadataCache()
+        return _cache
+
+
+def configure_metadata_cache(ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES,
+                             disk_dir: str = None, max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES) -> MetadataCache:
+    """Replace the global cache, e.g. to enable the on-disk store."""
+    global _cache
+    with _cache_lock:
+        _cache = MetadataCache(ttl, max_entries, disk_dir, max_disk_bytes)
+        return _cache
@@ -0,0 +1,263 @@
+"""
+Metrics
+Counters, gauges and histograms for the queue and the engines, readable as a
+dict (snapshot()) or in the Prometheus text format, optionally served over HTTP
+on localhost. Recording is a lock and a dict update; gauges that mirror queue
+state are computed only when read.
+"""
+
+import json
+import math
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+PREFIX = "smile_"  # Prepended to every exported metric name
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9464  # Port of start_server() unless another is given
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0)
+RATE_BUCKETS = tuple(1024.0 * 4 ** i for i in range(12))  # 1KB/s .. 4GB/s
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = ['%s="%s"' % (name, _escape(value)) for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic total, optionally split by label values."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}  # label values -> total
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def collect(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> list:
+        return [f"{self.name}{_labels(self.labels, key)} {_number(value)}" for key, value in self.collect().items()]
+
+
+class Gauge(Counter):
+    """Current value, set directly or read from a function when collected."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), function=None):
+        Counter.__init__(self, name, help, labels)
+        self.function = function  # () -> {label values: value}, replaces stored values when set
+
+    def set(self, value: float, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    def set_function(self, function):
+        self.function = function
+
+    def collect(self) -> dict:
+        if self.function is not None:
+            return self.function()
+        return Counter.collect(self)
+
+
+class Histogram:
+    """Bucketed observations with their sum and count, optionally split by label values."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: tuple = SECONDS_BUCKETS, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series = {}  # label values -> [per-bucket counts (not cumulative), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self) -> dict:
+        """label values -> {"buckets": {le: cumulative count}, "sum", "count"}."""
+        with self._lock:
+            series = {key: (list(counts), total, n) for key, (counts, total, n) in self._series.items()}
+        result = {}
+        for key, (counts, total, n) in series.items():
+            cumulative, running = {}, 0
+            for bound, count in zip(self.buckets, counts):
+                running += count
+                cumulative[bound] = running
+            result[key] = {"buckets": cumulative, "sum": total, "count": n}
+        return result
+
+    def render(self) -> list:
+        lines = []
+        for key, series in self.collect().items():
+            for bound, count in series["buckets"].items():
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(series['sum'])}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {series['count']}")
+        return lines
+
+
+class Metrics:
+    """The download manager's metrics, in registration order."""
+
+    def __init__(self):
+        self._metrics = []
+        self.bytes = self._add(Counter(PREFIX + "bytes_total", "Bytes received by all downloads."))
+        self.host_bytes = self._add(Counter(PREFIX + "host_bytes_total", "Bytes received per host.", ("host",)))
+        self.tasks_finished = self._add(Counter(PREFIX + "task_runs_total",
+                                                "Finished task runs by outcome: done, failed, cancelled or retried.",
+                                                ("outcome",)))
+        self.tasks = self._add(Gauge(PREFIX + "tasks", "Tasks in the queue by state.", ("state",)))
+        self.workers = self._add(Gauge(PREFIX + "workers", "Download worker threads running."))
+        self.open_breakers = self._add(Gauge(PREFIX + "host_breaker_open",
+                                             "1 while a host's circuit breaker keeps tasks off it.", ("host",)))
+        self.queue_wait = self._add(Histogram(PREFIX + "queue_wait_seconds",
+                                              "Time from enqueue (or end of backoff) to the start of a run."))
+        self.ttfb = self._add(Histogram(PREFIX + "ttfb_seconds",
+                                        "Time from request to response headers of direct downloads."))
+        self.task_duration = self._add(Histogram(PREFIX + "task_duration_seconds", "Wall time of a task run."))
+        self.task_throughput = self._add(Histogram(PREFIX + "task_throughput_bytes_per_second",
+                                                   "Bytes received per second of a run that finished.", RATE_BUCKETS))
+        self._task_bytes = {}  # task key -> bytes received since track_task()
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def transferred(self, nbytes: int, host: str = None, task_key=None):
+        """Count bytes received; called by the bandwidth governor for every chunk."""
+        self.bytes.inc(nbytes)
+        self.host_bytes.inc(nbytes, (host or "").lower())
+        if task_key in self._task_bytes:
+            with self._lock:
+                if task_key in self._task_bytes:
+                    self._task_bytes[task_key] += nbytes
+
+    def track_task(self, task_key):
+        """Start counting the bytes charged to task_key (a queued task's id)."""
+        with self._lock:
+            self._task_bytes[task_key] = 0
+
+    def untrack_task(self, task_key) -> int:
+        """Stop counting task_key; returns the bytes it received."""
+        with self._lock:
+            return self._task_bytes.pop(task_key, 0)
+
+    def snapshot(self) -> dict:
+        """name -> value for unlabelled metrics, or {label value: value} for labelled ones.
+
+        A histogram's value is {"buckets": {upper bound: cumulative count}, "sum", "count"}
+        (None before its first observation).
+        """
+        result = {}
+        for metric in self._metrics:
+            values = metric.collect()
+            if metric.labels:
+                result[metric.name] = {",".join(map(str, key)): value for key, value in values.items()}
+            else:
+                result[metric.name] = values.get((), None if metric.kind == "histogram" else 0)
+        return result
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            body, content_type = get_metrics().render().encode(), "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/metrics.json":
+            body, content_type = json.dumps(get_metrics().snapshot(), default=str).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Global metrics instance
+_metrics = None
+_metrics_lock = threading.Lock()
+_server = None
+
+
+def get_metrics() -> Metrics:
+    """Get or create the global metrics."""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics()
+        return _metrics
+
+
+def start_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> ThreadingHTTPServer:
+    """Serve /metrics (Prometheus text) and /metrics.json on host:port from a daemon thread.
+
+    Binds to localhost by default; port 0 picks a free port (see server.server_address).
+    """
+    global _server
+    with _metrics_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        return _server
+
+
+def stop_server():
+    global _server
+    with _metrics_lock:
+        server, _server = _server, None
+    if server is not None:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,86 @@
+"""
+Mirror Selection
+Tracks per-mirror throughput and time-to-first-byte for one direct download,
+spreads byte ranges across healthy mirrors and fails over from slow ones.
+"""
+
+import threading
+
+
+EWMA_WEIGHT = 0.3  # Weight of the newest throughput sample
+MIN_THROUGHPUT = 65536  # Bytes/second below which a mirror counts as slow
+GRACE_SECONDS = 5.0  # Measure this long before judging a mirror slow
+STALL_TIMEOUT = 10  # Read timeout when another mirror can take over
+
+
+class MirrorSet:
+    """URLs serving the same bytes, each with its own probe result and health stats."""
+
+    def __init__(self, remotes: dict):
+        # url -> probe dict (total_size, accepts_ranges, etag, last_modified)
+        self.remotes = dict(remotes)
+        self.urls = list(remotes)
+        self._rate = {url: None for url in self.urls}
+        self._ttfb = {url: None for url in self.urls}
+        self._failed = set()
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def has_alternative(self, url: str) -> bool:
+        """True if some healthy mirror other than url could take over."""
+        with self._lock:
+            return any(u != url and u not in self._failed for u in self.urls)
+
+    def is_failed(self, url: str) -> bool:
+        with self._lock:
+            return url in self._failed
+
+    def healthy(self) -> list:
+        with self._lock:
+            return [url for url in self.urls if url not in self._failed]
+
+    def next_url(self) -> str:
+        """Round-robin over healthy mirrors, used to spread the initial segments."""
+        with self._lock:
+            healthy = [url for url in self.urls if url not in self._failed]
+            if not healthy:
+                return None
+            url = healthy[self._next % len(healthy)]
+            self._next += 1
+            return url
+
+    def best(self, exclude: str = None) -> str:
+        """Fastest healthy mirror (unmeasured ones first, then lowest TTFB as tie-break)."""
+        with self._lock:
+            candidates = [url for url in self.urls if url not in self._failed and url != exclude]
+            if not candidates:
+                return None
+            return max(candidates, key=lambda u: (
+                self._rate[u] is None,
+                self._rate[u] or 0,
+                -(self._ttfb[u] or 0),
+            ))
+
+    def record_ttfb(self, url: str, seconds: float):
+        with self._lock:
+            self._ttfb[url] = seconds
+
+    def record_throughput(self, url: str, bytes_per_sec: float):
+        with self._lock:
+            old = self._rate[url]
+            self._rate[url] = bytes_per_sec if old is None else (
+                EWMA_WEIGHT * bytes_per_sec + (1 - EWMA_WEIGHT) * old)
+
+    def is_slow(self, url: str, bytes_per_sec: float, elapsed: float) -> bool:
+        """True if url should be abandoned for a faster mirror."""
+        return elapsed >= GRACE_SECONDS and bytes_per_sec < MIN_THROUGHPUT and self.has_alternative(url)
+
+    def mark_failed(self, url: str):
+        with self._lock:
+            self._failed.add(url)
+
+    def read_timeout(self, url: str, default: float) -> float:
+        return STALL_TIMEOUT if self.has_alternative(url) else default
@@ -6,8 +6,9 @@ Theme-aware UI for consistency.
 import tkinter as tk
 from tkinter import ttk
 import io
-import yt_dlp
-import requests
+from transport import get_transport
+from metadata_cache import get_metadata_cache
+from ydl_pool import get_ydl_pool
 from queue_system import add_to_queue
 from theme import get_theme_manager
 from PIL import Image, ImageTk
@@ -23,7 +24,7 @@ def _get_thumbnail_url(vid_id: str, url: str) -> str:
 def _load_thumbnail(url: str, size=(160, 90)) -> ImageTk.PhotoImage:
     """Load and resize thumbnail from URL."""
     try:
-        r = requests.get(url, timeout=5)
+        r = get_transport().get(url, timeout=5)
         r.raise_for_status()
         img = Image.open(io.BytesIO(r.content))
         img = img.convert("RGB")
@@ -35,13 +36,17 @@ def _load_thumbnail(url: str, size=(160, 90)) -> ImageTk.PhotoImage:
 
 def extract_playlist(url: str, quality: str, media_format: str):
     """Open a playlist selector window with thumbnails."""
-    try:
-        ydl_opts = {"quiet": True, "extract_flat": True}
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-    except Exception as e:
-        _show_error(str(e))
-        return
+    cache = get_metadata_cache()
+    info = cache.get(url, kind="flat")
+    if info is None:
+        try:
+            ydl_opts = {"quiet": True, "extract_flat": True}
+            with get_ydl_pool().checkout(ydl_opts) as ydl:
+                info = ydl.extract_info(url, download=False)
+                cache.put(url, ydl.sanitize_info(info), kind="flat")
+        except Exception as e:
+            _show_error(str(e))
+            return
 
     entries = info.get("entries", [])
     if not entries:
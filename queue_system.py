@@ -4,65 +4,485 @@ Highly optimized for speed, memory efficiency, and parallel downloads.
 """
 
 import time
+import heapq
 import threading
-from engine import download
+import concurrent.futures
+import engine
+from engine import DownloadCancelled, download
+from bandwidth import get_governor
+from fragments import get_fragment_budget
+from transcode import get_transcode_stage
+from metadata_cache import get_metadata_cache
+from router import DIRECT, get_router, url_host, valid_url_host
+from scheduler import Scheduler, NORMAL
+from transport import get_transport
+from journal import JOURNAL_PATH, QueueJournal
+from retry import MAX_ATTEMPTS, HostBreakers, backoff, classify
+from metrics import get_metrics
+from tasks import CANCELLED, DONE, FAILED, QUEUED, RUNNING, Task, TaskEvent, TaskRegistry
 from collections import deque
 
 
-download_queue = deque()  # Changed to deque for O(1) popleft operations
+MAX_WORKERS = 4  # Downloads running at once on worker threads; asyncio transfers do not hold one
+MAX_LOOP_TRANSFERS = 256  # Direct transfers running at once on the asyncio backend's event loop
+MAX_PER_HOST = 2  # Downloads running at once against one host
+SIZE_PROBE_WORKERS = 2  # Threads estimating task sizes for shortest-job-first
+QUEUE_DISPLAY = 100  # Queued tasks listed in the status snapshot
+BULK_BATCH = 5000  # URLs validated and queued per lock acquisition in add_bulk()
+EVENT_INTERVAL = 0.5  # Seconds between progress events for one task
+
+_download_backend = download  # engine.download or async_engine.download
+_loop_backend = None  # The async_engine module while it is the backend
+download_queue = Scheduler()  # Priority heap with aging, O(log n) push/pop
+_registry = TaskRegistry()  # Every queued and running task by id
+_held = {}  # id -> queued Task taken out of the scheduler by pause_task()
+_retrying = {}  # id -> queued Task waiting out its backoff after a retryable failure
+_retry_timers = []  # Heap of (retry_at, task id); entries of tasks no longer in _retrying are skipped
+_breakers = HostBreakers()  # Per-host circuit breakers; an open one parks the host in the scheduler
 pause_flag = False
-cancel_flag = False
 _lock = threading.Lock()
+_work_ready = threading.Condition(_lock)  # Notified when a queued task may be startable
+_pause_changed = threading.Condition()  # Notified on pause, resume and cancel, global or per task
+_stopping = False  # Set by shutdown(); workers exit instead of taking tasks
+
+# Worker pool
+_max_workers = MAX_WORKERS
+_running_workers = 0
+_loop_transfers = 0  # Tasks handed to the asyncio engine and not finished yet
+_worker_threads = []
+_host_limits = {}  # host -> concurrency cap overriding MAX_PER_HOST
+_host_active = {}  # host -> downloads running against it
+_worker_args = None  # (download_path, progress_hook) given to start_workers
+_probe_backlog = deque()  # Task ids waiting for a size estimate
+_probe_threads = 0
+_journal = None  # QueueJournal once open_journal() has run
+_metrics = get_metrics()
+_listeners = []  # Callables given every task event (see add_listener)
 
 # Status tracking for UI
-queued_items = deque(maxlen=100)  # Fixed max size for memory efficiency
-downloading_item = None  # {"url", "title", "speed", "percent"} or None
 completed_items = deque(maxlen=100)  # Keep only last 100 completed items
 show_speed = False
 _speed_str = ""
 
-# Performance tracking
+# Performance tracking (the full set is in metrics.get_metrics())
 download_stats = {
-    "total_downloaded": 0,
-    "total_time": 0,
-    "average_speed": 0.0
+    "total_downloaded": 0,  # Bytes received by finished task runs
+    "total_time": 0,  # Seconds spent in task runs
+    "last_start_latency": 0.0,  # Seconds from enqueue to start of the latest task
+    "average_speed": 0.0  # total_downloaded / total_time, bytes per second
 }
 
 
-def add_to_queue(url: str, quality: str = "Best", media_format: str = "Video"):
-    """Add a download task to the queue."""
-    with _lock:
-        url = url.strip()
-        download_queue.append((url, quality, media_format))
-        queued_items.append({"url": url, "quality": quality, "format": media_format, "title": url[:55] + ("..." if len(url) > 55 else "")})
+def add_to_queue(url: str, quality: str = "Best", media_format: str = "MP4", priority: int = NORMAL,
+                 size: int = None, **options) -> int:
+    """Add a download task to the queue and return its task id.
+
+    `priority` is HIGH, NORMAL or LOW; `size` is an estimate in bytes for
+    shortest-job-first ordering (probed in the background when omitted).
+    Extra keyword options (e.g. ``segments=8``) are forwarded to ``engine.download``.
+    """
+    return _enqueue_batch([url.strip()], quality, media_format, priority, options, size, validate=False)[0]
 
 
-def add_multiple(urls: list, quality: str = "Best", media_format: str = "Video"):
+def add_multiple(urls: list, quality: str = "Best", media_format: str = "MP4", **options):
     """Add multiple URLs to the queue."""
-    for url in urls:
-        url = url.strip()
+    return add_bulk(urls, quality, media_format, **options)
+
+
+def add_listener(callback):
+    """Call callback(event) for every task event, from the thread the event happens on.
+
+    Events are small dicts with an "event" key: "queued" (first_id, count), "started",
+    "progress" (at most every EVENT_INTERVAL per task), "paused", "resumed", "retrying",
+    "done", "failed" or "cancelled", plus the task's fields. Callbacks must not block.
+    """
+    with _lock:
+        _listeners.append(callback)
+
+
+def remove_listener(callback):
+    with _lock:
+        if callback in _listeners:
+            _listeners.remove(callback)
+
+
+def _emit(event: str, task: Task = None, **fields):
+    if _listeners:
+        if task is not None:
+            fields.update(task.as_dict())
+        fields["event"] = event
+        for callback in list(_listeners):
+            try:
+                callback(fields)
+            except Exception:
+                pass
+
+
+def add_bulk(source, quality: str = "Best", media_format: str = "MP4", priority: int = NORMAL,
+             batch_size: int = BULK_BATCH, **options) -> int:
+    """Queue every URL from an iterable of lines, or from the text file at path `source`.
+
+    Blank lines, ``#`` comments and lines without a scheme and host are skipped. URLs are queued
+    `batch_size` at a time with one lock acquisition and one journal transaction per
+    batch, so a million-line file streams through in bounded memory (beyond the queued
+    tasks themselves) and workers keep starting tasks in between. Returns the number queued.
+    """
+    if isinstance(source, str):
+        with open(source, "r", encoding="utf-8", errors="replace") as f:
+            return add_bulk(f, quality, media_format, priority, batch_size, **options)
+    added = 0
+    batch = []
+    for line in source:
+        url = line.strip()
         if url and not url.startswith("#"):
-            add_to_queue(url, quality, media_format)
+            batch.append(url)
+            if len(batch) >= batch_size:
+                added += len(_enqueue_batch(batch, quality, media_format, priority, options))
+                batch = []
+    if batch:
+        added += len(_enqueue_batch(batch, quality, media_format, priority, options))
+    return added
+
+
+def _enqueue_batch(urls: list, quality: str, media_format: str, priority: int, options: dict,
+                   size: int = None, validate: bool = True) -> list:
+    """Queue stripped URLs (those with a scheme and host, if validating) under one lock acquisition.
+
+    Each batch is routed once with Router.classify; returns the new task ids.
+    """
+    hosts = [valid_url_host(url) if validate else url_host(url) for url in urls]
+    if validate and not all(hosts):
+        urls = [url for url, host in zip(urls, hosts) if host]
+        hosts = [host for host in hosts if host]
+    backends = get_router().classify(urls, hosts)
+    now = time.time()
+    with _lock:
+        tasks = []
+        for url, host, backend in zip(urls, hosts, backends):
+            task = Task(_registry.new_id(), url, quality, media_format, options, host, priority, size, now, backend)
+            _registry.add(task)
+            download_queue.push(task)
+            tasks.append(task)
+        if _journal is not None:
+            _journal.enqueue_many([(task.id, task.url, quality, media_format, options, priority, size, now)
+                                   for task in tasks])
+        if len(tasks) == 1:
+            _work_ready.notify()
+        elif tasks:
+            _work_ready.notify_all()
+        if download_queue.shortest_first and size is None:
+            _probe_backlog.extend(task.id for task in tasks)
+    if _probe_backlog:
+        _start_probes()
+    if tasks:
+        _emit("queued", first_id=tasks[0].id, count=len(tasks))
+    return [task.id for task in tasks]
 
 
 def pause():
+    """Pause every running download (queued tasks still start, then wait)."""
     global pause_flag
-    pause_flag = True
+    with _pause_changed:
+        pause_flag = True
+    _sync_pause_events()
 
 
 def resume():
     global pause_flag
-    pause_flag = False
+    with _pause_changed:
+        pause_flag = False
+        _pause_changed.notify_all()
+    _sync_pause_events()
 
 
 def cancel():
-    global cancel_flag
-    cancel_flag = True
+    """Abort every download running right now; queued tasks still start."""
+    with _lock:
+        running = _registry.in_state(RUNNING)
+    for task in running:
+        task.cancel_event.set()
+    with _pause_changed:
+        _pause_changed.notify_all()
+
+
+def get_task(task_id: int):
+    """Dict view of a queued or running task, or None once it has finished."""
+    with _lock:
+        task = _registry.get(task_id)
+        return task.as_dict() if task is not None else None
+
+
+def pause_task(task_id: int) -> bool:
+    """Pause one task: a running one stops at its next progress report, a queued one won't start."""
+    with _lock:
+        task = _registry.get(task_id)
+        if task is None or task.paused:
+            return task is not None
+        task.paused = True
+        if task.state == QUEUED and (download_queue.remove(task_id) or _retrying.pop(task_id, None)):
+            _held[task_id] = task  # A backoff still running is dropped: resume_task() queues it at once
+    _sync_pause_events()
+    _emit("paused", task)
+    return True
+
+
+def resume_task(task_id: int) -> bool:
+    with _lock:
+        task = _registry.get(task_id)
+        if task is None:
+            return False
+        task.paused = False
+        if _held.pop(task_id, None) is not None:
+            download_queue.push(task)
+            _work_ready.notify()
+    with _pause_changed:
+        _pause_changed.notify_all()
+    _sync_pause_events()
+    _emit("resumed", task)
+    return True
+
+
+def _sync_pause_events():
+    """Mirror the global and per-task pause flags onto running tasks' pause events."""
+    with _lock:
+        for task in _registry.in_state(RUNNING):
+            if pause_flag or task.paused:
+                task.pause_event.set()
+            else:
+                task.pause_event.clear()
+
+
+def cancel_task(task_id: int) -> bool:
+    """Drop a queued task, or abort a running one mid-transfer; False if it already finished."""
+    with _lock:
+        task = _registry.get(task_id)
+        if task is None:
+            return False
+        queued = task.state == QUEUED
+        if queued:
+            download_queue.remove(task_id)
+            _held.pop(task_id, None)
+            _retrying.pop(task_id, None)
+            _registry.set_state(task, CANCELLED)
+            if _journal is not None:
+                _journal.finished(task_id, CANCELLED)
+    if queued:
+        _emit("cancelled", task)
+        return True
+    task.cancel_event.set()
+    with _pause_changed:
+        _pause_changed.notify_all()
+    return True
+
+
+def set_bandwidth_limit(bytes_per_sec: float):
+    """Cap total download throughput; 0 removes the cap. Applies to running downloads too."""
+    get_governor().set_global_limit(bytes_per_sec)
+
+
+def set_host_bandwidth_limit(host: str, bytes_per_sec: float):
+    """Cap throughput to a single host; 0 removes the cap."""
+    get_governor().set_host_limit(host, bytes_per_sec)
+
+
+def set_task_bandwidth_limit(task_id: int, bytes_per_sec: float):
+    """Cap throughput of task `task_id` while it runs; 0 removes the cap."""
+    get_governor().set_task_limit(task_id, bytes_per_sec)
+
+
+def set_use_archive(enabled: bool):
+    """Skip items already in the download path's archive (off by default)."""
+    engine.set_use_archive(enabled)
+
+
+def get_use_archive() -> bool:
+    return engine.USE_ARCHIVE
+
+
+def set_fragment_budget(workers: int):
+    """Cap fragment download threads shared by all streaming tasks."""
+    get_fragment_budget().set_total(workers)
+
+
+def set_max_workers(workers: int):
+    """Change how many downloads run at once; extra workers exit after their current task."""
+    global _max_workers
+    with _lock:
+        _max_workers = max(1, int(workers))
+        spawn = _max_workers - _running_workers
+        args = _worker_args
+        _work_ready.notify_all()  # Idle workers above the new size exit
+    if args is not None:
+        for _ in range(spawn):
+            _spawn_worker(*args)
+
+
+def set_priority(task_id: int, priority: int) -> bool:
+    """Move a queued task to another priority level; False if it already started."""
+    with _lock:
+        task = _registry.get(task_id)
+        if task is None or task.state != QUEUED:
+            return False
+        if _journal is not None:
+            _journal.set_priority(task_id, priority)
+        if not download_queue.set_priority(task_id, priority):
+            task.priority = priority  # Held or backing off; keyed again when it is pushed back
+        return True
+
+
+def set_shortest_first(enabled: bool):
+    """Order tasks of equal priority smallest first, by HEAD/metadata size estimates."""
+    with _lock:
+        download_queue.set_shortest_first(enabled)
+        if enabled:
+            _probe_backlog.extend(task.id for task in download_queue.unsized())
+    _start_probes()
+
+
+def _start_probes():
+    global _probe_threads
+    with _lock:
+        spawn = min(SIZE_PROBE_WORKERS - _probe_threads, len(_probe_backlog))
+        _probe_threads += max(0, spawn)
+    for _ in range(spawn):
+        threading.Thread(target=_probe_loop, name="size-probe", daemon=True).start()
+
+
+def _probe_loop():
+    """Estimate sizes for backlogged tasks until the backlog is empty."""
+    global _probe_threads
+    while True:
+        with _lock:
+            task = None
+            while _probe_backlog and not _stopping:
+                task = _registry.get(_probe_backlog.popleft())
+                if task is not None and task.state == QUEUED and task.size is None:
+                    break
+                task = None
+            if task is None:
+                _probe_threads -= 1
+                return
+        try:
+            _estimate_size(task)
+        except Exception:
+            pass
+
+
+def _estimate_size(task: Task):
+    task_id, url = task.id, task.url
+    size = None
+    if (task.backend or get_router().route(url)) == DIRECT:
+        try:
+            response = get_transport().head(url, allow_redirects=True, timeout=15)
+            size = int(response.headers.get("content-length", 0)) or None
+        except Exception:
+            pass
+    else:
+        # Only what an earlier extraction left in the cache; extracting here would cost as much as the download
+        info = get_metadata_cache().get(url)
+        if info:
+            size = info.get("filesize") or info.get("filesize_approx")
+    if size:
+        with _lock:
+            if not download_queue.set_size(task_id, size):
+                task.size = size
+            if _journal is not None:
+                _journal.set_size(task_id, size)
+
+
+def open_journal(path: str = JOURNAL_PATH) -> int:
+    """Journal the queue to `path` and re-queue whatever an earlier session left unfinished.
+
+    Call once at startup, before anything is queued. Returns the number of restored tasks.
+    """
+    global _journal
+    journal = QueueJournal(path)
+    journal.compact()
+    pending = journal.pending()
+    recent = journal.recent_finished(completed_items.maxlen)
+    backends = get_router().classify(row[1] for row in pending)
+    with _lock:
+        _journal = journal
+        _registry.reserve_ids(journal.max_id())
+        for (task_id, url, quality, media_format, options, priority, size, enqueued), backend in zip(pending, backends):
+            task = Task(task_id, url, quality, media_format, options, url_host(url), priority, size, enqueued,
+                        backend)
+            _registry.add(task)
+            download_queue.push(task)
+        for task_id, url, state, title, error in recent:
+            title = title or url
+            completed_items.append({"title": (title if state != FAILED else f"❌ {(error or '')[:35]}")[:60],
+                                    "url": url})
+        _work_ready.notify_all()
+    return len(pending)
+
+
+def set_host_concurrency(host: str, limit: int):
+    """Cap concurrent downloads from one host; 0 restores the default (MAX_PER_HOST)."""
+    host = host.lower()
+    with _lock:
+        if limit > 0:
+            _host_limits[host] = int(limit)
+        else:
+            _host_limits.pop(host, None)
+        download_queue.unpark(host)
+        _work_ready.notify_all()
+
+
+def set_download_backend(name: str):
+    """Choose the engine for upcoming tasks: "threads" (default) or "async" (needs aiohttp).
+
+    With "async", direct files run on the event loop without holding a worker thread, up to
+    MAX_LOOP_TRANSFERS at once; streaming and plugin tasks still take a worker each.
+    """
+    global _download_backend, _loop_backend
+    if name == "async":
+        import async_engine
+        if not async_engine.HAS_AIOHTTP:
+            raise RuntimeError("The asyncio backend requires the aiohttp package")
+        _download_backend, _loop_backend = async_engine.download, async_engine
+    elif name == "threads":
+        _download_backend, _loop_backend = download, None
+    else:
+        raise ValueError(f"Unknown download backend: {name}")
 
 
 def get_queue_size():
     with _lock:
-        return len(download_queue)
+        return len(download_queue) + len(_retrying)
+
+
+def is_idle() -> bool:
+    """True when no task is queued, backing off, paused or running."""
+    with _lock:
+        return not len(_registry)
+
+
+def get_host_health() -> dict:
+    """host -> {"state", "failures", "until"} for hosts with recent failures.
+
+    state is "closed", "held" (honouring a Retry-After), "open" or "half-open".
+    """
+    with _lock:
+        return _breakers.snapshot()
+
+
+def _task_gauge() -> dict:
+    with _lock:
+        return {("queued",): len(download_queue), ("retrying",): len(_retrying), ("paused",): len(_held),
+                ("running",): _registry.count(RUNNING)}
+
+
+def _breaker_gauge() -> dict:
+    with _lock:
+        health = _breakers.snapshot()
+    return {(host,): int(h["state"] in ("open", "held")) for host, h in health.items()}
+
+
+# Gauges of queue state are read when metrics are collected, not on every change
+_metrics.tasks.set_function(_task_gauge)
+_metrics.workers.set_function(lambda: {(): _running_workers})
+_metrics.open_breakers.set_function(_breaker_gauge)
 
 
 def set_show_speed(value: bool):
@@ -75,115 +495,383 @@ def get_show_speed():
 
 
 def get_status_snapshot():
-    """Return current queued, downloading, completed for UI."""
+    """Return current queued, downloading (list of active tasks), completed, speed and transcode stage for UI.
+
+    Queued tasks are listed in the order the scheduler will start them, then those
+    waiting to retry, then paused ones.
+    """
     with _lock:
-        q = list(queued_items) if queued_items else []
-        d = downloading_item.copy() if downloading_item else None
+        q = [task.as_dict() for task in download_queue.ordered(QUEUE_DISPLAY)]
+        q += [task.as_dict() for task in list(_retrying.values())[:QUEUE_DISPLAY - len(q)]]
+        q += [task.as_dict() for task in list(_held.values())[:QUEUE_DISPLAY - len(q)]]
+        d = [task.as_dict() for task in _registry.in_state(RUNNING)]
         c = list(completed_items) if completed_items else []
         s = _speed_str
-    return q, d, c, s
+    t = get_transcode_stage().snapshot()
+    return q, d, c, s, t
 
 
-def _set_downloading(item):
-    global downloading_item
+def _add_completed(title: str, url: str):
     with _lock:
-        downloading_item = item
+        completed_items.append({"title": title[:60], "url": url})
 
 
-def _clear_downloading():
-    global downloading_item
-    with _lock:
-        downloading_item = None
+def _set_speed(s: str):
+    global _speed_str
+    _speed_str = s or ""
+
+
+def _host_limit(host: str) -> int:
+    return _host_limits.get(host, MAX_PER_HOST)
+
+
+def _host_open(host: str) -> bool:
+    # allow() admits a half-open host's probe, so it must come last
+    return (_host_active.get(host, 0) < _host_limit(host) and not _loop_full(host)) and _breakers.allow(host)
+
+
+def _loop_full(host: str) -> bool:
+    """True if host's tasks would run on the event loop and it already has MAX_LOOP_TRANSFERS."""
+    return (_loop_transfers >= MAX_LOOP_TRANSFERS and _loop_backend is not None
+            and _loop_backend.runs_on_loop(host, get_router().route_host(host)))
+
+
+def _promote_due():
+    """Queue tasks whose backoff is over and unpark hosts whose breaker cooled down (caller holds _lock)."""
+    now = time.time()
+    while _retry_timers and _retry_timers[0][0] <= now:
+        retry_at, task_id = heapq.heappop(_retry_timers)
+        task = _retrying.get(task_id)
+        if task is not None and task.retry_at == retry_at:
+            del _retrying[task_id]
+            download_queue.push(task)
+    for host in _breakers.due(now):
+        download_queue.unpark(host)
+
+
+def _next_timer() -> float:
+    """Seconds until a backoff or breaker cooldown ends (caller holds _lock), or None if none is pending."""
+    times = [t for t in (_retry_timers[0][0] if _retry_timers else None, _breakers.next_change()) if t is not None]
+    return max(0.0, min(times) - time.time()) if times else None
+
+
+def _take_task():
+    """Pop the next scheduled task whose host is under its cap (caller holds _lock)."""
+    _promote_due()
+    entry = download_queue.pop(_host_open)
+    if entry is None:
+        return None
+    _host_active[entry.host] = _host_active.get(entry.host, 0) + 1
+    entry.started = time.time()
+    entry.cancel_event = TaskEvent()
+    entry.pause_event = TaskEvent()
+    if pause_flag or entry.paused:
+        entry.pause_event.set()
+    download_stats["last_start_latency"] = entry.started - entry.enqueued
+    _metrics.queue_wait.observe(entry.started - max(entry.enqueued, entry.retry_at or 0.0))
+    _metrics.track_task(entry.id)
+    _registry.set_state(entry, RUNNING)
+    return entry
 
 
-def _remove_from_queued(url):
+def _release_host(host: str):
     with _lock:
-        for i, x in enumerate(queued_items):
-            if x.get("url") == url:
-                queued_items.pop(i)
-                break
+        left = _host_active.get(host, 0) - 1
+        if left > 0:
+            _host_active[host] = left
+        else:
+            _host_active.pop(host, None)
+        download_queue.unpark(host)
+        _work_ready.notify()
 
 
-def _add_completed(title: str, url: str):
+def _spawn_worker(download_path, progress_hook):
+    global _running_workers
     with _lock:
-        completed_items.append({"title": title[:60], "url": url})
+        if _running_workers >= _max_workers:
+            return
+        _running_workers += 1
+        thread = threading.Thread(target=_worker_loop, args=(download_path, progress_hook), daemon=True)
+        _worker_threads.append(thread)
+    thread.start()
 
 
-def _set_speed(s: str):
-    global _speed_str
-    _speed_str = s or ""
+def start_workers(download_path, progress_hook=None, workers: int = None):
+    """Start the download worker pool (MAX_WORKERS threads unless `workers` is given)."""
+    global _worker_args, _max_workers, _stopping
+    with _lock:
+        _stopping = False
+        _worker_args = (download_path, progress_hook)
+        if workers:
+            _max_workers = max(1, int(workers))
+        spawn = _max_workers - _running_workers
+    for _ in range(spawn):
+        _spawn_worker(download_path, progress_hook)
 
 
 def worker(download_path, progress_hook=None):
-    """Background worker that processes the download queue with optimizations."""
-    global cancel_flag, pause_flag, download_queue, download_stats
+    """Background worker that processes the download queue with optimizations.
+
+    Runs one download at a time; start_workers() runs several of these.
+    """
+    global _running_workers
+    with _lock:
+        _running_workers += 1
+    _worker_loop(download_path, progress_hook)
 
-    start_time = time.time()
+
+def _worker_loop(download_path, progress_hook):
+    global _running_workers, _loop_transfers
 
     while True:
         with _lock:
-            if not download_queue:
-                task = None
-            else:
-                task = download_queue.popleft()
-                # Remove from queued display - optimized with deque
-                if task and len(queued_items) > 0:
-                    if queued_items[0].get("url") == task[0]:
-                        queued_items.popleft()
-
-        if task is None:
-            time.sleep(1)
+            entry = None
+            while entry is None:
+                if _stopping or _running_workers > _max_workers:
+                    _running_workers -= 1
+                    _worker_threads[:] = [t for t in _worker_threads if t is not threading.current_thread()]
+                    return
+                entry = _take_task()
+                if entry is None:
+                    _work_ready.wait(_next_timer())
+            on_loop = _loop_backend is not None and _loop_backend.runs_on_loop(entry.url, entry.backend)
+            if on_loop:
+                _loop_transfers += 1  # Counted with the pop, so another worker's _loop_full() sees it
+
+        if on_loop:
+            _start_on_loop(entry, download_path, progress_hook)  # Releases the host when the transfer ends
             continue
+        try:
+            _run_task(entry, download_path, progress_hook)
+        finally:
+            _release_host(entry.host)
 
-        path = download_path() if callable(download_path) else download_path
-        url, quality, media_format = task
-        cancel_flag = False
-        task_start_time = time.time()
-
-        # Get title for display
-        title = _extract_title_from_url(url)
-
-        def hook(d):
-            if cancel_flag:
-                raise Exception("CANCELLED")
-            while pause_flag:
-                time.sleep(0.5)
-            if progress_hook:
-                progress_hook(d)
-            
-            status = d.get("status")
-            if status == "downloading":
-                speed = d.get("_speed_str", "") or str(d.get("speed", ""))
-                info = d.get("info_dict") or {}
-                disp_title = info.get("title", title) if isinstance(info, dict) else title
-                _set_speed(speed)
-                _set_downloading({
-                    "title": disp_title or title,
-                    "url": url,
-                    "speed": speed,
-                    "percent": d.get("_percent_str", "0%")
-                })
-            elif status == "finished":
-                info = d.get("info_dict") or {}
-                fn = info.get("title", title) if isinstance(info, dict) else title
-                _add_completed(fn, url)
-                _clear_downloading()
-                _set_speed("")
-                
-                # Update stats
-                task_time = time.time() - task_start_time
-                download_stats["total_time"] += task_time
 
+def shutdown(cancel_running: bool = False, timeout: float = None):
+    """Stop the worker pool: idle workers exit at once, busy ones after their task.
+
+    With cancel_running the tasks in flight are aborted (and stay queued in the journal).
+    Waits up to `timeout` seconds for the workers and any asyncio transfers, then closes the
+    journal and the asyncio engine.
+    """
+    global _stopping, _journal
+    with _lock:
+        _stopping = True
+        _work_ready.notify_all()
+        threads = list(_worker_threads)
+        _probe_backlog.clear()
+    if cancel_running:
+        cancel()  # The journal keeps these pending, see _TaskRun.report
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for thread in threads:
+        if thread is not threading.current_thread():
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+    with _lock:
+        while _loop_transfers and (deadline is None or time.monotonic() < deadline):
+            _work_ready.wait(None if deadline is None else deadline - time.monotonic())
+        journal, _journal = _journal, None
+        busy = _running_workers or _loop_transfers
+        loop_backend = _loop_backend
+    if journal is not None and not busy:
+        journal.close()
+    if loop_backend is not None and not busy:
+        loop_backend.close_async_engine()
+
+
+class _TaskRun:
+    """One run of a task: the progress hook the engine calls, and reporting how the run ended.
+
+    On the asyncio loop the hook runs on the shared executor, so it never waits out a
+    pause there; the transfer waits on the loop instead (see task.pause_event).
+    """
+
+    def __init__(self, task: Task, download_path, progress_hook, on_loop: bool = False):
+        self.task = task
+        self.path = download_path() if callable(download_path) else download_path
+        self.progress_hook = progress_hook
+        self.on_loop = on_loop
+        self.journal = _journal
+        self.completed = []
+        self.reported = {}  # The engine's error event; its exception decides whether to retry
+        self.last_event = 0.0  # When the latest progress event went out
+        self.title = task.title = _extract_title_from_url(task.url)
+        task.speed = "Initializing..."
+        if self.journal is not None:
+            self.journal.started(task.id)
+        _emit("started", task)
+
+    def hook(self, d):
+        task, title = self.task, self.title
+        if d.get("status") == "error" and "exception" in d:
+            self.reported.update(d)  # Forwarded once we know whether the task is retried
+            return
+        if (pause_flag or task.paused) and not self.on_loop:
+            with _pause_changed:
+                while (pause_flag or task.paused) and not task.cancel_event.is_set():
+                    _pause_changed.wait()
+        if task.cancel_event.is_set():
+            raise DownloadCancelled()
+        if self.progress_hook:
+            self.progress_hook(d)
+
+        status = d.get("status")
+        if status == "downloading":
+            speed = d.get("_speed_str", "") or str(d.get("speed", ""))
+            info = d.get("info_dict") or {}
+            disp_title = info.get("title", title) if isinstance(info, dict) else title
+            _set_speed(speed)
+            task.title = disp_title or title
+            task.speed = speed
+            task.percent = d.get("_percent_str", "0%")
+            if self.journal is not None:
+                self.journal.progress(task.id, d.get("downloaded_bytes") or 0, disp_title)
+            if _listeners and time.monotonic() - self.last_event >= EVENT_INTERVAL:
+                self.last_event = time.monotonic()
+                _emit("progress", task)
+        elif status == "finished" and not self.completed:
+            # Streaming tasks report "finished" once per format; list the task once
+            info = d.get("info_dict") or {}
+            fn = info.get("title", title) if isinstance(info, dict) else title
+            self.completed.append(fn)
+            _add_completed(fn, task.url)
+
+    def reported_failure(self):
+        """Classify the error event of a backend that returned False."""
+        return classify(self.reported.get("exception"), self.reported.get("error"))
+
+    def report(self, failure, retry_in: float):
+        """Journal and announce the outcome _finish_task settled on."""
+        task, journal = self.task, self.journal
+        error = failure.reason if failure is not None else None
+        if retry_in is not None:
+            if journal is not None:
+                journal.retrying(task.id, error)
+            if self.progress_hook:
+                self.progress_hook({"status": "retrying", "error": error, "attempt": task.attempts, "delay": retry_in})
+            _emit("retrying", task, delay=retry_in)
+            return
+        if failure is not None:
+            _add_completed(f"❌ {error[:35]}", task.url)
+            if self.progress_hook:
+                self.progress_hook({"status": "error", "error": error})
+        if journal is not None and not (task.state == CANCELLED and _stopping):
+            # Tasks cut short by shutdown() stay pending in the journal and restart next session
+            journal.finished(task.id, task.state, title=self.completed[0] if self.completed else None, error=error)
+        _emit(task.state, task)
+
+
+def _run_task(task: Task, download_path, progress_hook):
+    run = _TaskRun(task, download_path, progress_hook)
+    state, failure = DONE, None
+    try:
+        if _download_backend(task.url, run.path, task.quality, task.media_format, run.hook,
+                             cancel_event=task.cancel_event, backend=task.backend, task_key=task.id,
+                             **task.options) is False:
+            failure = run.reported_failure()
+    except DownloadCancelled:
+        state = CANCELLED
+    except Exception as e:
+        failure = classify(e)
+    finally:
+        retry_in = _finish_task(task, state, failure)
+    run.report(failure, retry_in)
+
+
+def _start_on_loop(task: Task, download_path, progress_hook):
+    """Hand a direct task to the asyncio engine and return without waiting for it.
+
+    The worker thread goes back for the next task; _finish_on_loop records the outcome
+    and frees the host slot. At most MAX_LOOP_TRANSFERS run this way at once; the worker
+    counted this one in _loop_transfers when it took the task.
+    """
+    run = _TaskRun(task, download_path, progress_hook, on_loop=True)
+    try:
+        engine = _loop_backend.get_async_engine()
+        future = engine.submit(task.url, run.path, run.hook, cancel_event=task.cancel_event,
+                               pause_event=task.pause_event, task_key=task.id, **task.options)
+    except Exception as e:
+        future = concurrent.futures.Future()
+        future.set_exception(e)
+        _finish_on_loop(run, future)
+        return
+
+    def done(future):
+        # Journal writes and listeners stay off the event loop thread
         try:
-            _set_downloading({"title": title, "url": url, "speed": "Initializing...", "percent": "0%"})
-            download(url, path, quality, media_format, hook)
-        except Exception as e:
-            if "CANCELLED" not in str(e):
-                _add_completed(f"❌ {str(e)[:35]}", url)
-                if progress_hook:
-                    progress_hook({"status": "error", "error": str(e)})
-            _clear_downloading()
+            engine.executor.submit(_finish_on_loop, run, future)
+        except RuntimeError:  # Executor already shut down by close()
+            _finish_on_loop(run, future)
+
+    future.add_done_callback(done)
+
+
+def _finish_on_loop(run: _TaskRun, future):
+    global _loop_transfers
+    task = run.task
+    state, failure = DONE, None
+    try:
+        if future.result() is False:
+            failure = run.reported_failure()
+    except (DownloadCancelled, concurrent.futures.CancelledError):
+        state = CANCELLED
+    except Exception as e:
+        failure = classify(e)
+    finally:
+        retry_in = _finish_task(task, state, failure)
+        _release_host(task.host)
+        with _lock:
+            _loop_transfers -= 1
+            if _loop_transfers == MAX_LOOP_TRANSFERS - 1:
+                download_queue.unpark_all()  # Hosts parked while the loop was full
+            _work_ready.notify_all()
+    run.report(failure, retry_in)
+
+
+def _finish_task(task: Task, state: str, failure) -> float:
+    """Record a run's outcome with the host's breaker and either finish the task or schedule its retry.
+
+    Returns the backoff in seconds if the task was re-queued, else None.
+    """
+    with _lock:
+        elapsed = time.time() - task.started
+        received = _metrics.untrack_task(task.id)
+        _metrics.task_duration.observe(elapsed)
+        if state == DONE and failure is None and received:
+            _metrics.task_throughput.observe(received / max(elapsed, 1e-3))
+        download_stats["total_downloaded"] += received
+        download_stats["total_time"] += elapsed
+        download_stats["average_speed"] = download_stats["total_downloaded"] / max(download_stats["total_time"], 1e-3)
+        if failure is None:
+            if state == DONE:
+                _breakers.record_success(task.host)
+            else:
+                _breakers.abandon(task.host)
+        else:
+            if failure.host_fault:
+                _breakers.record_failure(task.host, failure.retry_after)
+            else:
+                _breakers.record_success(task.host)  # The host answered; the item itself is bad
+            task.attempts += 1
+            task.error = failure.reason
+            state = FAILED
+        retry_in = None
+        if (state == FAILED and failure.retryable and task.attempts < MAX_ATTEMPTS and not _stopping
+                and not task.cancel_event.is_set()):
+            retry_in = backoff(task.attempts, failure.retry_after)
+            task.retry_at = time.time() + retry_in
+            task.speed = ""
+            state = QUEUED
+            if task.paused:
+                _held[task.id] = task
+            else:
+                _retrying[task.id] = task
+                heapq.heappush(_retry_timers, (task.retry_at, task.id))
+        _registry.set_state(task, state)
+        _metrics.tasks_finished.inc(1, "retried" if retry_in is not None else state)
+        if not _registry.count(RUNNING):
             _set_speed("")
+        _work_ready.notify()  # A waiting worker re-arms its timer for the new backoff
+        return retry_in
 
 
 def _extract_title_from_url(url: str) -> str:
@@ -0,0 +1,251 @@
+"""
+Retry Policy
+Sorts download errors from the requests, aiohttp and yt-dlp paths into retryable
+and fatal, spaces retries out with jittered exponential backoff (never sooner than
+a server's Retry-After), and keeps a circuit breaker per host so workers stop
+spending their slots on a host that keeps failing.
+"""
+
+import re
+import time
+import errno
+import random
+from email.utils import parsedate_to_datetime
+
+import requests
+from yt_dlp.utils import ExtractorError, GeoRestrictedError, UnsupportedError
+
+from integrity import IntegrityError
+
+# The request itself is malformed: no scheme, a scheme nothing handles, or an unusable host
+_BAD_REQUEST = (requests.exceptions.InvalidURL, requests.exceptions.MissingSchema, requests.exceptions.InvalidSchema)
+try:
+    import aiohttp
+    _BAD_REQUEST += (aiohttp.InvalidURL,)
+except ImportError:
+    pass
+
+
+MAX_ATTEMPTS = 5  # Runs of one task before a retryable error counts as final
+BACKOFF_BASE = 5.0  # Seconds before the first retry (before jitter)
+BACKOFF_MAX = 600.0  # Longest backoff between two runs of a task
+MAX_RETRY_AFTER = 3600.0  # Longest Retry-After we honour
+BREAKER_THRESHOLD = 5  # Consecutive host failures that open a host's breaker
+BREAKER_COOLDOWN = 30.0  # Seconds a breaker stays open the first time; doubles per failed probe
+BREAKER_MAX_COOLDOWN = 1800.0
+
+RETRYABLE_STATUS = frozenset((408, 425, 429, 500, 502, 503, 504, 507, 509, 520, 521, 522, 523, 524))
+LOCAL_ERRNOS = frozenset((errno.ENOSPC, errno.EACCES, errno.EPERM, errno.EROFS, errno.EDQUOT, errno.ENAMETOOLONG))
+
+# yt-dlp often reports only a message; these decide when no exception in the chain does
+_FATAL_MESSAGES = (
+    "unsupported url", "video unavailable", "private video", "not available in your country",
+    "geo restrict", "has been removed", "copyright", "sign in to confirm", "members-only", "members only",
+    "requires payment", "no video formats found", "requested format is not available", "is not a valid url",
+    "has been terminated", "drm protected",
+)
+_RETRYABLE_MESSAGES = (
+    "timed out", "timeout", "temporarily", "temporary failure", "connection reset", "connection aborted",
+    "connection refused", "remote end closed", "incomplete read", "download incomplete", "closed early",
+    "server disconnected", "unable to download webpage", "too many requests", "try again later",
+    "name resolution", "network is unreachable",
+)
+_HTTP_STATUS = re.compile(r"HTTP Error (\d{3})")
+
+
+class Failure:
+    """How one failed run should be handled."""
+
+    __slots__ = ("retryable", "host_fault", "retry_after", "reason")
+
+    def __init__(self, retryable: bool, host_fault: bool, reason: str, retry_after: float = None):
+        self.retryable = retryable
+        self.host_fault = host_fault  # Counts against the host's circuit breaker
+        self.retry_after = retry_after  # Seconds the server asked us to wait, if it did
+        self.reason = reason
+
+
+def _chain(exc):
+    """exc and the exceptions behind it (cause, context, yt-dlp's wrapped exc_info)."""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        yield exc
+        wrapped = getattr(exc, "exc_info", None)
+        inner = wrapped[1] if isinstance(wrapped, tuple) and len(wrapped) > 1 else None
+        exc = inner or getattr(exc, "cause", None) or exc.__cause__ or exc.__context__
+        if not isinstance(exc, BaseException):
+            exc = None
+
+
+def _http_status(exc):
+    """(status, headers) of an HTTP error from requests, aiohttp, urllib or yt-dlp, else (None, None)."""
+    response = getattr(exc, "response", None)
+    for status in (getattr(response, "status_code", None), getattr(response, "status", None),
+                   getattr(exc, "status", None), getattr(exc, "code", None)):
+        if isinstance(status, int) and 100 <= status < 600:
+            headers = getattr(response, "headers", None) or getattr(exc, "headers", None)
+            return status, headers
+    return None, None
+
+
+def parse_retry_after(value) -> float:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def _from_status(status: int, headers, reason: str) -> Failure:
+    if status in RETRYABLE_STATUS:
+        retry_after = parse_retry_after(headers.get("Retry-After")) if headers is not None else None
+        if retry_after is not None:
+            retry_after = min(retry_after, MAX_RETRY_AFTER)
+        return Failure(True, True, reason, retry_after)
+    return Failure(False, False, reason)  # 403, 404, 410, 451, ...: the host answered, the item is gone
+
+
+def classify(exc: BaseException = None, message: str = None) -> Failure:
+    """Decide whether a failed download is worth retrying.
+
+    Walks the exception chain for an HTTP status first, then for known network and
+    local-disk errors, then falls back to yt-dlp's message text. Malformed URLs and plain
+    ValueError/TypeError (a bad argument or task option, raised before any I/O) are
+    fatal; subclasses such as JSONDecodeError can come from a bad response and are not.
+    Errors nothing recognises are retried, but do not count against the host.
+    """
+    reason = message or (str(exc) if exc is not None else "") or "Download failed"
+    for e in _chain(exc):
+        status, headers = _http_status(e)
+        if status is not None and status >= 400:
+            return _from_status(status, headers, reason)
+    for e in _chain(exc):
+        if isinstance(e, IntegrityError):
+            return Failure(False, False, reason)
+        if isinstance(e, _BAD_REQUEST) or type(e) in (ValueError, TypeError):
+            return Failure(False, False, reason)
+        if isinstance(e, (GeoRestrictedError, UnsupportedError)):
+            return Failure(False, False, reason)
+        if isinstance(e, (requests.Timeout, requests.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                          TimeoutError, ConnectionError)):
+            return Failure(True, True, reason)
+        if isinstance(e, OSError) and e.errno in LOCAL_ERRNOS:
+            return Failure(False, False, reason)
+    text = reason.lower()
+    match = _HTTP_STATUS.search(reason)
+    if match:
+        return _from_status(int(match.group(1)), None, reason)
+    if any(pattern in text for pattern in _FATAL_MESSAGES):
+        return Failure(False, False, reason)
+    if any(pattern in text for pattern in _RETRYABLE_MESSAGES):
+        return Failure(True, True, reason)
+    if any(isinstance(e, ExtractorError) and e.expected for e in _chain(exc)):
+        return Failure(False, False, reason)  # yt-dlp marks user-facing extractor errors as expected
+    return Failure(True, False, reason)
+
+
+def backoff(attempt: int, retry_after: float = None) -> float:
+    """Seconds to wait before run number attempt + 1 (attempt >= 1): equal-jitter exponential backoff."""
+    ceiling = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+    delay = ceiling / 2 + random.uniform(0, ceiling / 2)
+    return max(delay, retry_after) if retry_after else delay
+
+
+class HostBreakers:
+    """Circuit breaker per host.
+
+    Closed: tasks run. After BREAKER_THRESHOLD consecutive host failures the breaker
+    opens and the host gets no new tasks for the cooldown. Then it is half-open: one
+    probe task runs; success closes it, failure reopens it with double the cooldown.
+    A Retry-After holds the host at least that long even below the threshold.
+    Not thread-safe on its own: queue_system calls it under its lock.
+    """
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = {}  # host -> consecutive host failures
+        self._until = {}  # host -> time it may take tasks again (open or held)
+        self._cooldown = {}  # host -> cooldown of its current/last opening
+        self._half_open = set()  # Cooled-down hosts waiting for their probe task
+        self._probing = set()  # Half-open hosts with their probe task running
+
+    def _expire(self, host: str):
+        del self._until[host]
+        if self._failures.get(host, 0) >= self.threshold:
+            self._half_open.add(host)
+
+    def allow(self, host: str, now: float = None) -> bool:
+        """May a task on host start now? Admits the single probe of a half-open host."""
+        until = self._until.get(host)
+        if until is not None:
+            if (now or time.time()) < until:
+                return False
+            self._expire(host)
+        if host in self._probing:
+            return False
+        if host in self._half_open:
+            self._half_open.discard(host)
+            self._probing.add(host)
+        return True
+
+    def record_success(self, host: str):
+        self._failures.pop(host, None)
+        self._cooldown.pop(host, None)
+        self._half_open.discard(host)
+        self._probing.discard(host)
+
+    def record_failure(self, host: str, retry_after: float = None, now: float = None) -> bool:
+        """Count a host failure; returns True if it opened the breaker."""
+        now = now or time.time()
+        failures = self._failures[host] = self._failures.get(host, 0) + 1
+        if host in self._probing:
+            self._probing.discard(host)
+            cooldown = self._cooldown[host] = min(BREAKER_MAX_COOLDOWN, self._cooldown.get(host, self.cooldown) * 2)
+        elif failures == self.threshold:
+            cooldown = self._cooldown[host] = self.cooldown
+        else:
+            cooldown = 0.0
+        wait = max(cooldown, retry_after or 0.0)
+        if wait > 0:
+            self._half_open.discard(host)
+            self._until[host] = max(now + wait, self._until.get(host, 0.0))
+        return cooldown > 0
+
+    def abandon(self, host: str):
+        """A probe ended without telling us anything (cancelled); let the next task probe."""
+        if host in self._probing:
+            self._probing.discard(host)
+            self._half_open.add(host)
+
+    def next_change(self) -> float:
+        """Earliest time a blocked host may take tasks again, or None."""
+        return min(self._until.values()) if self._until else None
+
+    def due(self, now: float = None) -> list:
+        """Blocked hosts whose wait is over; they are closed or half-open from here on."""
+        now = now or time.time()
+        hosts = [host for host, until in self._until.items() if until <= now]
+        for host in hosts:
+            self._expire(host)
+        return hosts
+
+    def state(self, host: str, now: float = None) -> str:
+        if host in self._probing or host in self._half_open:
+            return "half-open"
+        if self._until.get(host, 0.0) > (now or time.time()):
+            return "open" if self._failures.get(host, 0) >= self.threshold else "held"
+        return "closed"
+
+    def snapshot(self) -> dict:
+        """host -> {"state", "failures", "until"} for every host with a failure on record."""
+        now = time.time()
+        return {host: {"state": self.state(host, now), "failures": failures, "until": self._until.get(host)}
+                for host, failures in self._failures.items()}
@@ -0,0 +1,119 @@
+"""
+URL Router
+Maps each URL to a download backend by domain suffix. Hosts are matched label
+by label against a registry (so "m.youtube.com" matches "youtube.com" but
+"notyoutube.com.evil" does not), and each host's result is cached.
+"""
+
+import re
+import threading
+
+
+STREAMING = "streaming"  # yt-dlp backend
+DIRECT = "direct"  # Plain HTTP backend
+HOST_CACHE_SIZE = 65536  # Hosts remembered before the cache is reset
+
+# Optional scheme, optional user@, then the host (bracketed for IPv6 literals)
+_HOST_RE = re.compile(r"\s*(?:[A-Za-z][A-Za-z0-9+.\-]*://)?(?:[^@/?#]*@)?(\[[^\]/?#]*\]|[^:/?#]*)")
+# Required scheme, optional user@, then a non-empty host without whitespace, ending the URL or before port/path/query
+_URL_RE = re.compile(r"[A-Za-z][A-Za-z0-9+.\-]*://(?:[^@/?#\s]*@)?(\[[^\]/?#\s]+\]|[^:/?#\s\[\]]+)(?:[:/?#]|$)")
+
+
+def url_host(url: str) -> str:
+    """Lower-cased host of url without scheme, credentials or port (cheaper than urlparse)."""
+    host = _HOST_RE.match(url).group(1).lower().rstrip(".")
+    return host[1:-1] if host.startswith("[") else host
+
+
+def valid_url_host(url: str) -> str:
+    """url_host of a stripped url that has a scheme and a host without whitespace, else ""."""
+    match = _URL_RE.match(url)
+    if match is None:
+        return ""
+    host = match.group(1).lower().rstrip(".")
+    return host[1:-1] if host.startswith("[") else host
+
+
+class Router:
+    """Domain-suffix registry of backends, plus handlers for plugin backends."""
+
+    def __init__(self, default: str = DIRECT):
+        self.default = default
+        self._domains = {}  # domain -> backend name
+        self._handlers = {}  # plugin backend name -> download callable
+        self._cache = {}  # host -> backend name
+        self._lock = threading.Lock()
+
+    def register_domains(self, domains, backend: str):
+        """Route these domains and all their subdomains to `backend`."""
+        with self._lock:
+            for domain in domains:
+                self._domains[domain.lower().strip(".")] = backend
+            self._cache = {}
+
+    def unregister_domains(self, domains):
+        with self._lock:
+            for domain in domains:
+                self._domains.pop(domain.lower().strip("."), None)
+            self._cache = {}
+
+    def register_backend(self, name: str, handler, domains=()):
+        """Add a plugin backend with the engine.download signature, optionally claiming domains."""
+        with self._lock:
+            self._handlers[name] = handler
+        if domains:
+            self.register_domains(domains, name)
+
+    def handler(self, name: str):
+        return self._handlers.get(name)
+
+    def route_host(self, host: str) -> str:
+        backend = self._cache.get(host)
+        if backend is None:
+            backend = self._lookup(host)
+            cache = self._cache
+            if len(cache) >= HOST_CACHE_SIZE:
+                cache = self._cache = {}
+            cache[host] = backend
+        return backend
+
+    def _lookup(self, host: str) -> str:
+        # Most specific suffix wins: a.b.example.com, b.example.com, example.com, com
+        domains = self._domains
+        label_start = 0
+        while True:
+            backend = domains.get(host[label_start:])
+            if backend is not None:
+                return backend
+            dot = host.find(".", label_start)
+            if dot < 0:
+                return self.default
+            label_start = dot + 1
+
+    def route(self, url: str) -> str:
+        """Backend name for url."""
+        return self.route_host(url_host(url))
+
+    def classify(self, urls, hosts=None) -> list:
+        """Backend names for many URLs at once (one dict hit per already-seen host).
+
+        Pass the URLs' hosts too when they are already known, to skip parsing them again.
+        """
+        route_host = self.route_host
+        if hosts is None:
+            hosts = map(url_host, urls)
+        return [route_host(host) for host in hosts]
+
+
+# Global router instance
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> Router:
+    """Get or create the global URL router."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = Router()
+        return _router
@@ -0,0 +1,209 @@
+"""
+Download Scheduler
+Priority queue of download tasks ordered by a virtual start time: the enqueue
+time, pushed back PRIORITY_STEP seconds per priority level and, with
+shortest-job-first on, by the estimated size (capped at MAX_SIZE_DELAY).
+Every waiting task ages at the same rate, so a task's key never changes while
+it waits; the heap stays valid without re-sorting, and no job can be
+overtaken by newer ones for longer than its penalty.
+"""
+
+import heapq
+
+
+HIGH, NORMAL, LOW = 0, 1, 2  # Priority levels
+PRIORITY_STEP = 600.0  # Seconds of waiting one priority level is worth
+SJF_BYTES_PER_SECOND = 10485760  # Shortest-job-first: each 10MB of size counts as 1s later
+MAX_SIZE_DELAY = 1800.0  # Most a large job is pushed back by its size (starvation bound)
+
+
+class Scheduler:
+    """Per-host heaps of tasks.Task records plus a heap of each open host's next task.
+
+    Push, pop and reprioritise are O(log n). A host at its concurrency cap is parked as
+    a whole (one entry), so a million queued URLs on one CDN cost nothing extra while
+    its slots are full. Stale heap pairs (from reprioritise or remove) are dropped
+    lazily. Not thread-safe on its own: queue_system calls it under its lock.
+    """
+
+    def __init__(self, shortest_first: bool = False):
+        self.shortest_first = shortest_first
+        self._tasks = {}  # task id -> Task
+        self._hosts = {}  # host -> heap of (key, task id)
+        self._live = {}  # host -> queued tasks (heaps are rebuilt when stale pairs dominate)
+        self._heads = []  # (key, task id, host) of open hosts; current only if it matches _announced
+        self._announced = {}  # open host -> (key, task id) of its entry in _heads
+        self._parked = set()  # Hosts at their concurrency cap
+
+    def _key(self, entry) -> float:
+        key = entry.enqueued + entry.priority * PRIORITY_STEP
+        if self.shortest_first and entry.size:
+            key += min(MAX_SIZE_DELAY, entry.size / SJF_BYTES_PER_SECOND)
+        return key
+
+    def _valid(self, pair, host: str) -> bool:
+        entry = self._tasks.get(pair[1])
+        return entry is not None and entry.key == pair[0] and entry.host == host
+
+    def _head(self, host: str):
+        """(key, task id) of host's next live task, dropping stale pairs on the way, or None."""
+        heap = self._hosts.get(host)
+        while heap:
+            if self._valid(heap[0], host):
+                return heap[0]
+            heapq.heappop(heap)
+        self._hosts.pop(host, None)
+        self._live.pop(host, None)
+        return None
+
+    def _announce(self, host: str):
+        """Publish host's next task in _heads unless the host is parked."""
+        if host in self._parked:
+            return
+        head = self._head(host)
+        if head is None:
+            self._announced.pop(host, None)
+        elif self._announced.get(host) != head:
+            self._announced[host] = head
+            heapq.heappush(self._heads, (head[0], head[1], host))
+            if len(self._heads) > 2 * len(self._announced) + 64:
+                self._heads = [(key, task_id, h) for h, (key, task_id) in self._announced.items()]
+                heapq.heapify(self._heads)
+
+    def _publish(self, entry):
+        entry.key = self._key(entry)
+        pair = (entry.key, entry.id)
+        heap = self._hosts.setdefault(entry.host, [])
+        heapq.heappush(heap, pair)
+        if len(heap) > 2 * self._live.get(entry.host, 0) + 64:
+            heap[:] = [p for p in heap if self._valid(p, entry.host)]
+            heapq.heapify(heap)
+        current = self._announced.get(entry.host)
+        if entry.host not in self._parked and (current is None or pair < current):
+            self._announced[entry.host] = pair
+            heapq.heappush(self._heads, (entry.key, entry.id, entry.host))
+
+    def push(self, entry):
+        """Queue a Task (its id, host, priority, size and enqueued time set the order)."""
+        self._tasks[entry.id] = entry
+        self._live[entry.host] = self._live.get(entry.host, 0) + 1
+        self._publish(entry)
+
+    def pop(self, host_open=None):
+        """Remove and return the first Task whose host passes host_open(host), or None.
+
+        A host that fails host_open is parked until unpark(host).
+        """
+        heads = self._heads
+        while heads:
+            key, task_id, host = heapq.heappop(heads)
+            if self._announced.get(host) != (key, task_id):
+                continue
+            del self._announced[host]
+            if self._head(host) != (key, task_id):
+                self._announce(host)  # Its head was removed or reprioritised
+                continue
+            if host_open is not None and not host_open(host):
+                self._parked.add(host)
+                continue
+            heapq.heappop(self._hosts[host])
+            entry = self._tasks.pop(task_id)
+            self._live[host] -= 1
+            self._announce(host)
+            return entry
+        return None
+
+    def unpark(self, host: str):
+        """Make host's tasks eligible again (call when a slot on it frees up)."""
+        if host in self._parked:
+            self._parked.discard(host)
+            self._announce(host)
+
+    def unpark_all(self):
+        for host in list(self._parked):
+            self.unpark(host)
+
+    def set_priority(self, task_id: int, priority: int) -> bool:
+        entry = self._tasks.get(task_id)
+        if entry is None:
+            return False
+        entry.priority = priority
+        self._publish(entry)
+        return True
+
+    def set_size(self, task_id: int, size: int) -> bool:
+        entry = self._tasks.get(task_id)
+        if entry is None:
+            return False
+        entry.size = size
+        if self.shortest_first:
+            self._publish(entry)
+        return True
+
+    def set_shortest_first(self, enabled: bool):
+        self.shortest_first = enabled
+        self._hosts, self._heads, self._announced = {}, [], {}
+        for entry in self._tasks.values():
+            entry.key = self._key(entry)
+            self._hosts.setdefault(entry.host, []).append((entry.key, entry.id))
+        for host, heap in self._hosts.items():
+            heapq.heapify(heap)
+        for host in list(self._hosts):
+            self._announce(host)
+
+    def remove(self, task_id: int) -> bool:
+        entry = self._tasks.pop(task_id, None)
+        if entry is None:
+            return False
+        self._live[entry.host] -= 1
+        return True
+
+    def get(self, task_id: int):
+        return self._tasks.get(task_id)
+
+    def unsized(self) -> list:
+        """Queued tasks without a size estimate."""
+        return [e for e in self._tasks.values() if e.size is None]
+
+    def ordered(self, limit: int) -> list:
+        """The next `limit` tasks in scheduling order, ignoring host caps; O(limit log limit).
+
+        Walks the heap arrays best-first instead of sorting every queued task.
+        """
+        # Frontier of (key, task id, kind, index, host): kind 0 walks _heads, kind 1 a host heap
+        frontier = []
+        if self._heads:
+            frontier.append(self._heads[0][:2] + (0, 0, None))
+        for host in self._parked:
+            heap = self._hosts.get(host)
+            if heap:
+                heapq.heappush(frontier, heap[0] + (1, 0, host))
+        result, seen = [], set()
+        while frontier and len(result) < limit:
+            key, task_id, kind, index, host = heapq.heappop(frontier)
+            heap = self._heads if kind == 0 else self._hosts[host]
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, heap[child][:2] + (kind, child, host))
+            if kind == 0:
+                host = heap[index][2]
+                if self._announced.get(host) == (key, task_id):
+                    heapq.heappush(frontier, self._hosts[host][0] + (1, 0, host))
+            elif task_id not in seen and self._valid((key, task_id), host):
+                seen.add(task_id)
+                result.append(self._tasks[task_id])
+        return result
+
+    def clear(self):
+        self._tasks.clear()
+        self._hosts.clear()
+        self._live.clear()
+        self._heads.clear()
+        self._announced.clear()
+        self._parked.clear()
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def __contains__(self, task_id: int) -> bool:
+        return task_id in self._tasks
@@ -0,0 +1,150 @@
+"""
+Task Registry
+Compact per-task records with stable ids, indexed by id and by state so
+lookup, removal and state changes are O(1). Each task carries its own pause
+flag and cancel event.
+"""
+
+import time
+import threading
+from itertools import count
+
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+LIVE_STATES = (QUEUED, RUNNING)  # States a task is held in the registry for
+
+
+class TaskEvent(threading.Event):
+    """threading.Event that also wakes asyncio waiters when it is set or cleared.
+
+    A coroutine registers an asyncio.Event with watch(); every transition sets it through
+    loop.call_soon_threadsafe, so the coroutine awaits the change instead of polling.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._watchers = set()  # (loop, asyncio.Event)
+        self._watchers_lock = threading.Lock()
+
+    def set(self):
+        super().set()
+        self._notify()
+
+    def clear(self):
+        super().clear()
+        self._notify()
+
+    def watch(self, loop, changed):
+        with self._watchers_lock:
+            self._watchers.add((loop, changed))
+
+    def unwatch(self, loop, changed):
+        with self._watchers_lock:
+            self._watchers.discard((loop, changed))
+
+    def _notify(self):
+        with self._watchers_lock:
+            watchers = list(self._watchers)
+        for loop, changed in watchers:
+            loop.call_soon_threadsafe(changed.set)
+
+
+class Task:
+    """One download: what to fetch, where it is in the queue and how it is doing."""
+
+    __slots__ = (
+        "id", "url", "quality", "media_format", "options",
+        "host", "priority", "size", "enqueued", "key",  # Scheduler fields
+        "backend",  # Router backend name, classified when queued
+        "state", "paused", "cancel_event", "pause_event",
+        "title", "speed", "percent", "error", "started",
+        "attempts", "retry_at",  # Failed runs so far; when a retryable failure may run again
+    )
+
+    def __init__(self, task_id: int, url: str, quality: str, media_format: str, options: dict, host: str,
+                 priority: int, size: int = None, enqueued: float = None, backend: str = None):
+        self.id = task_id
+        self.url = url
+        self.quality = quality
+        self.media_format = media_format
+        self.options = options
+        self.host = host
+        self.priority = priority
+        self.size = size  # Estimated bytes, or None while unknown
+        self.enqueued = enqueued or time.time()
+        self.key = 0.0
+        self.backend = backend
+        self.state = QUEUED
+        self.paused = False
+        self.cancel_event = None  # TaskEvent, created when the task starts
+        self.pause_event = None  # TaskEvent set while the task is paused, created when it starts
+        self.title = None  # Display title once known; the URL stands in until then
+        self.speed = ""
+        self.percent = "0%"
+        self.error = None
+        self.started = None
+        self.attempts = 0
+        self.retry_at = None
+
+    def as_dict(self) -> dict:
+        """Display/API view of the task."""
+        title = self.title or (self.url[:55] + ("..." if len(self.url) > 55 else ""))
+        return {
+            "id": self.id, "url": self.url, "quality": self.quality, "format": self.media_format,
+            "backend": self.backend, "priority": self.priority, "size": self.size, "state": self.state,
+            "paused": self.paused, "title": title, "speed": self.speed, "percent": self.percent, "error": self.error,
+            "attempts": self.attempts, "retry_at": self.retry_at,
+        }
+
+
+class TaskRegistry:
+    """Live tasks by id, plus an insertion-ordered index per state.
+
+    Not thread-safe on its own: queue_system calls it under its lock.
+    """
+
+    def __init__(self):
+        self._tasks = {}  # id -> Task
+        self._by_state = {state: {} for state in LIVE_STATES}  # state -> {id: Task}, oldest first
+        self._ids = count()
+
+    def new_id(self) -> int:
+        return next(self._ids)
+
+    def reserve_ids(self, last_id: int):
+        """Hand out ids above last_id from now on (ids already used by a journal)."""
+        self._ids = count(last_id + 1)
+
+    def add(self, task: Task):
+        self._tasks[task.id] = task
+        self._by_state[task.state][task.id] = task
+
+    def get(self, task_id: int):
+        return self._tasks.get(task_id)
+
+    def set_state(self, task: Task, state: str):
+        """Move task to state; leaving the live states drops it from the registry."""
+        self._by_state[task.state].pop(task.id, None)
+        task.state = state
+        if state in self._by_state:
+            self._by_state[state][task.id] = task
+        else:
+            self._tasks.pop(task.id, None)
+
+    def remove(self, task_id: int):
+        task = self._tasks.pop(task_id, None)
+        if task is not None:
+            self._by_state[task.state].pop(task_id, None)
+        return task
+
+    def in_state(self, state: str) -> list:
+        return list(self._by_state[state].values())
+
+    def count(self, state: str) -> int:
+        return len(self._by_state[state])
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def __contains__(self, task_id: int) -> bool:
+        return task_id in self._tasks
@@ -0,0 +1,184 @@
+"""
+Transcode Stage
+Runs FFmpeg post-processing (audio extraction, remuxing, merging separate
+video and audio streams) on a bounded process pool, so a download slot is released as
+soon as the raw streams land on disk.
+"""
+
+import os
+import threading
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import count
+
+
+TRANSCODE_WORKERS = os.cpu_count() or 2  # FFmpeg jobs running at once
+MAX_PENDING = TRANSCODE_WORKERS * 4  # submit() blocks beyond this many unfinished jobs
+FAILED_HISTORY = 20  # Recent failures kept for the status panel
+
+MERGE_FIELDS = ("format_id", "acodec", "vcodec", "protocol", "filepath")
+
+
+def _run_job(job: dict) -> str:
+    """Child-process entry point: run one yt-dlp FFmpeg postprocessor, return the output path."""
+    from yt_dlp.postprocessor import FFmpegExtractAudioPP, FFmpegMergerPP, FFmpegVideoRemuxerPP
+
+    if job["kind"] == "merge":
+        pp = FFmpegMergerPP(None)
+    elif job["kind"] == "remux":
+        pp = FFmpegVideoRemuxerPP(None, preferedformat=job["container"])
+    else:
+        pp = FFmpegExtractAudioPP(None, preferredcodec=job["codec"], preferredquality=job["quality"])
+    if not pp.available:
+        raise RuntimeError("FFmpeg is not installed")
+    files_to_delete, info = pp.run(dict(job["info"]))
+    for path in files_to_delete:
+        if path != info["filepath"] and os.path.exists(path):
+            os.remove(path)
+    return info["filepath"]
+
+
+def merge_job(info: dict) -> dict:
+    """Job that muxes separately downloaded video/audio streams into info["filepath"]."""
+    formats = [{k: f.get(k) for k in MERGE_FIELDS} for f in info["requested_formats"]]
+    return {
+        "kind": "merge",
+        "info": {
+            "filepath": info["filepath"],
+            "ext": info.get("ext"),
+            "vcodec": info.get("vcodec"),
+            "acodec": info.get("acodec"),
+            "requested_formats": formats,
+            "__files_to_merge": [f["filepath"] for f in formats],
+        },
+    }
+
+
+def audio_job(info: dict, codec: str, quality: str) -> dict:
+    """Job that converts the downloaded file at info["filepath"] to `codec`."""
+    return {
+        "kind": "audio",
+        "codec": codec,
+        "quality": quality,
+        "info": {
+            "filepath": info["filepath"],
+            "ext": info.get("ext"),
+            "vcodec": info.get("vcodec"),
+            "acodec": info.get("acodec"),
+        },
+    }
+
+
+def remux_job(info: dict, container: str) -> dict:
+    """Job that copies the streams of info["filepath"] into a `container` file."""
+    return {
+        "kind": "remux",
+        "container": container,
+        "info": {
+            "filepath": info["filepath"],
+            "ext": info.get("ext"),
+            "vcodec": info.get("vcodec"),
+            "acodec": info.get("acodec"),
+        },
+    }
+
+
+class TranscodeStage:
+    """Process pool for FFmpeg jobs plus the bookkeeping the status panel shows."""
+
+    def __init__(self, workers: int = TRANSCODE_WORKERS, max_pending: int = MAX_PENDING):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._callbacks = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transcode-done")
+        self._jobs = OrderedDict()  # job id -> {"title", "kind"}, in submission order
+        self._failed = deque(maxlen=FAILED_HISTORY)
+        self._ids = count()
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn, not fork: the parent has Tk and download threads running
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def submit(self, job: dict, title: str = "", on_done=None, on_error=None) -> int:
+        """Queue a job; on_done(output_path) or on_error(exception) runs once it finishes.
+
+        Blocks while MAX_PENDING jobs are unfinished, which holds the download stage back
+        instead of letting raw files pile up on disk.
+        """
+        self._slots.acquire()
+        job_id = next(self._ids)
+        with self._lock:
+            self._jobs[job_id] = {"title": title, "kind": job["kind"]}
+        try:
+            future = self._get_pool().submit(_run_job, job)
+        except Exception:
+            self._finish(job_id)
+            raise
+        future.add_done_callback(lambda f: self._dispatch(job_id, title, f, on_done, on_error))
+        return job_id
+
+    def _dispatch(self, job_id: int, title: str, future, on_done, on_error):
+        # Callbacks hash the output, so keep them off the pool's management thread
+        try:
+            self._callbacks.submit(self._complete, job_id, title, future, on_done, on_error)
+        except RuntimeError:  # Interpreter shutting down
+            self._complete(job_id, title, future, on_done, on_error)
+
+    def _complete(self, job_id: int, title: str, future, on_done, on_error):
+        try:
+            error = future.exception()
+            if error is None:
+                if on_done:
+                    on_done(future.result())
+            else:
+                with self._lock:
+                    self._failed.append({"title": title, "error": str(error)})
+                    if isinstance(error, BrokenProcessPool):
+                        # A worker died (e.g. killed FFmpeg child); start a fresh pool next time
+                        self._pool = None
+                if on_error:
+                    on_error(error)
+        finally:
+            self._finish(job_id)
+
+    def _finish(self, job_id: int):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+        self._slots.release()
+
+    def snapshot(self) -> dict:
+        """{"active": [...], "waiting": [...], "failed": [...]} for the status panel."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+            failed = list(self._failed)
+        # The pool runs jobs in submission order, so the oldest `workers` ones are running
+        return {"active": jobs[:self.workers], "waiting": jobs[self.workers:], "failed": failed}
+
+    def close(self):
+        """Wait for queued jobs and shut the pool down."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+        self._callbacks.shutdown(wait=True)
+
+
+# Global transcode stage instance
+_stage = None
+_stage_lock = threading.Lock()
+
+
+def get_transcode_stage() -> TranscodeStage:
+    """Get or create the global transcode stage."""
+    global _stage
+    with _stage_lock:
+        if _stage is None:
+            _stage = TranscodeStage()
+        return _stage
@@ -0,0 +1,110 @@
+"""
+Shared HTTP Transport
+One process-wide requests session with keep-alive connection pools per host,
+used by the download engine, the playlist thumbnail loader and metadata probes.
+"""
+
+import atexit
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+POOL_CONNECTIONS = 32  # Number of per-host pools kept alive
+POOL_MAXSIZE = 16  # Keep-alive connections per host
+POOL_BLOCK = True  # Wait for a free connection instead of exceeding POOL_MAXSIZE
+
+
+class Transport:
+    """Keep-alive HTTP session with bounded per-host connection pools."""
+
+    def __init__(self, pool_connections: int = POOL_CONNECTIONS, pool_maxsize: int = POOL_MAXSIZE,
+                 pool_block: bool = POOL_BLOCK):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.host_limits = {}
+        self._closed = False
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": USER_AGENT})
+        for prefix in ("http://", "https://"):
+            self.session.mount(prefix, self._adapter(pool_maxsize))
+
+    def _adapter(self, maxsize: int) -> HTTPAdapter:
+        return HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=maxsize,
+                           pool_block=self.pool_block)
+
+    def set_host_limit(self, host: str, max_connections: int):
+        """Cap concurrent connections to one host (e.g. a CDN) below or above the default."""
+        host = host.lower()
+        self.host_limits[host] = max_connections
+        for scheme in ("http", "https"):
+            self.session.mount(f"{scheme}://{host}/", self._adapter(max_connections))
+
+    def host_limit(self, url: str) -> int:
+        """Return the connection cap that applies to the host of `url`."""
+        host = (urlparse(url).hostname or "").lower()
+        return self.host_limits.get(host, self.pool_maxsize)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.session.get(url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> requests.Response:
+        return self.session.head(url, **kwargs)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self):
+        """Close every pooled connection."""
+        if not self._closed:
+            self._closed = True
+            self.session.close()
+
+
+# Global transport instance
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> Transport:
+    """Get or create the global transport."""
+    global _transport
+    with _transport_lock:
+        if _transport is None or _transport.closed:
+            _transport = Transport()
+        return _transport
+
+
+def configure_transport(pool_connections: int = POOL_CONNECTIONS, pool_maxsize: int = POOL_MAXSIZE,
+                        pool_block: bool = POOL_BLOCK) -> Transport:
+    """Replace the global transport with one using the given pool settings.
+
+    Meant to be called before downloads start; the previous transport is closed.
+    """
+    global _transport
+    with _transport_lock:
+        old = _transport
+        _transport = Transport(pool_connections, pool_maxsize, pool_block)
+        if old is not None:
+            for host, limit in old.host_limits.items():
+                _transport.set_host_limit(host, limit)
+    if old is not None:
+        old.close()
+    return _transport
+
+
+def close_transport():
+    """Shut down the global transport and its connection pools."""
+    global _transport
+    with _transport_lock:
+        old, _transport = _transport, None
+    if old is not None:
+        old.close()
+
+
+atexit.register(close_transport)
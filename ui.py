@@ -7,12 +7,12 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import os
 import sys
-import threading
 
 from queue_system import (
     add_to_queue,
     add_multiple,
-    worker,
+    start_workers,
+    open_journal,
     pause,
     resume,
     cancel,
@@ -20,6 +20,8 @@ from queue_system import (
     get_status_snapshot,
     set_show_speed,
     get_show_speed,
+    set_use_archive,
+    get_use_archive,
 )
 from playlist_system import extract_playlist
 from theme import get_theme_manager
@@ -106,6 +108,9 @@ def launch_ui():
         elif d.get("status") == "finished":
             percent_var.set("100%")
             status_var.set("✅ Completed")
+        elif d.get("status") == "retrying":
+            reason = (d.get("error") or "")[:40]
+            status_var.set(f"↻ Retry {d.get('attempt', 1)} in {d.get('delay', 0):.0f}s: {reason}")
         elif d.get("status") == "error":
             status_var.set("❌ Error: " + d.get("error", "Unknown")[:50])
 
@@ -196,20 +201,39 @@ def launch_ui():
         if speed_btn[0]:
             speed_btn[0].config(text="📊 Speed: ON" if v else "📊 Speed: OFF")
 
+    archive_btn = [None]
+
+    def toggle_archive():
+        v = not get_use_archive()
+        set_use_archive(v)
+        if archive_btn[0]:
+            archive_btn[0].config(text="🗄 Archive: ON" if v else "🗄 Archive: OFF")
+
     def refresh_status_panels():
-        q, d, c, s = get_status_snapshot()
+        q, d, c, s, tc = get_status_snapshot()
         queued_list.delete(0, tk.END)
         for item in q:
             t = item.get('title', '')[:60]
             queued_list.insert(tk.END, f"  ▪ {t}{'...' if len(item.get('title', '')) > 60 else ''}")
         
         if d:
-            down_text = d.get("title", "")[:50]
-            if get_show_speed() and d.get("speed"):
-                down_text += f"\n  📊 {d.get('speed')}"
-            downloading_var.set(down_text)
+            lines = []
+            for item in d[:3]:
+                line = item.get("title", "")[:50]
+                if get_show_speed() and item.get("speed"):
+                    line += f"  📊 {item.get('speed')}"
+                lines.append(line)
+            if len(d) > 3:
+                lines.append(f"(+{len(d) - 3} more)")
+            down_text = "\n".join(lines)
         else:
-            downloading_var.set("—")
+            down_text = "—"
+        converting = tc["active"] + tc["waiting"]
+        if converting:
+            down_text += f"\n  🎞 Converting: {converting[0]['title'][:40]}"
+            if len(converting) > 1:
+                down_text += f" (+{len(converting) - 1} more)"
+        downloading_var.set(down_text)
         
         completed_list.delete(0, tk.END)
         for item in c[-20:]:
@@ -339,6 +363,10 @@ def launch_ui():
     tk.Button(control_btn_frame, text="🎨 Themes", command=open_theme_selector, bg=C["accent"], fg=C["text"],
               font=("Segoe UI", 9, "bold"), width=12, relief="flat", padx=8, pady=5,
               activebackground=C["accent"], activeforeground=C["gold"], cursor="hand2").grid(row=0, column=4, padx=4)
+    archive_btn[0] = tk.Button(control_btn_frame, text="🗄 Archive: OFF", command=toggle_archive, bg=C["accent"],
+                               fg=C["text"], font=("Segoe UI", 9, "bold"), width=12, relief="flat", padx=8, pady=5,
+                               activebackground=C["accent"], activeforeground=C["gold"], cursor="hand2")
+    archive_btn[0].grid(row=0, column=5, padx=4)
 
     # ========== PROGRESS ==========
     prog_frame = tk.Frame(root, bg=C["bg_dark"])
@@ -406,7 +434,11 @@ def launch_ui():
     def path_getter():
         return path_var.get()
 
-    threading.Thread(target=worker, args=(path_getter, progress_hook), daemon=True).start()
+    try:
+        open_journal()
+    except Exception:
+        pass  # No journal: the queue still works, it just won't survive a restart
+    start_workers(path_getter, progress_hook)
     refresh_status_panels()
 
     root.mainloop()
@@ -0,0 +1,121 @@
+"""
+YoutubeDL Instance Pool
+Keeps warm yt_dlp.YoutubeDL objects keyed by their effective options so each
+task skips extractor loading, cookie-jar setup and HTTP handler creation.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import yt_dlp
+
+
+MAX_IDLE_PER_KEY = 4  # Warm instances kept for one option set
+MAX_KEYS = 16  # Distinct option sets kept (least recently used dropped first)
+
+
+def options_key(ydl_opts: dict) -> str:
+    """Stable key for an option dict (hooks must not be part of it)."""
+    return json.dumps(ydl_opts, sort_keys=True, default=repr)
+
+
+def _close(ydl: yt_dlp.YoutubeDL):
+    try:
+        ydl.close()
+    except Exception:
+        pass
+
+
+class YdlPool:
+    """Idle YoutubeDL instances by option set; one task holds an instance at a time."""
+
+    def __init__(self, max_idle_per_key: int = MAX_IDLE_PER_KEY, max_keys: int = MAX_KEYS):
+        self.max_idle_per_key = max_idle_per_key
+        self.max_keys = max_keys
+        self._idle = OrderedDict()  # key -> [YoutubeDL, ...]
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    @contextmanager
+    def checkout(self, ydl_opts: dict, progress_hooks=(), post_hooks=(), post_processors=()):
+        """Borrow an instance for ydl_opts with this task's hooks attached.
+
+        `post_processors` are (PostProcessor, when) pairs. Hooks and postprocessors are
+        detached again on return, so tasks never see each other's callbacks.
+        An instance whose task raised is closed instead of being returned.
+        """
+        key = options_key(ydl_opts)
+        ydl = self._take(key)
+        if ydl is None:
+            ydl = yt_dlp.YoutubeDL(dict(ydl_opts))
+            with self._lock:
+                self.created += 1
+        else:
+            with self._lock:
+                self.reused += 1
+        for hook in progress_hooks:
+            ydl.add_progress_hook(hook)
+        for hook in post_hooks:
+            ydl.add_post_hook(hook)
+        for pp, when in post_processors:
+            ydl.add_post_processor(pp, when=when)
+        try:
+            yield ydl
+        except BaseException:
+            _close(ydl)
+            raise
+        else:
+            for pp, when in post_processors:
+                ydl._pps[when].remove(pp)
+            self._give_back(key, ydl)
+
+    def _take(self, key: str):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self._idle.move_to_end(key)
+                return idle.pop()
+        return None
+
+    def _give_back(self, key: str, ydl: yt_dlp.YoutubeDL):
+        ydl._progress_hooks.clear()
+        ydl._post_hooks.clear()
+        ydl._download_retcode = 0
+        evicted = []
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            self._idle.move_to_end(key)
+            if len(idle) < self.max_idle_per_key:
+                idle.append(ydl)
+            else:
+                evicted.append(ydl)
+            while len(self._idle) > self.max_keys:
+                _, old = self._idle.popitem(last=False)
+                evicted.extend(old)
+        for old in evicted:
+            _close(old)
+
+    def close(self):
+        """Close every idle instance."""
+        with self._lock:
+            idle = [ydl for instances in self._idle.values() for ydl in instances]
+            self._idle.clear()
+        for ydl in idle:
+            _close(ydl)
+
+
+# Global pool instance
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_ydl_pool() -> YdlPool:
+    """Get or create the global YoutubeDL pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = YdlPool()
+        return _pool